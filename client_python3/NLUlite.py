@@ -4,7 +4,7 @@
 """
 NLUlite is a high-level Natural Language Understanding framework.
 
-This file is the client part of the framework (for Python > 3.3),
+This file is the client part of the framework (for Python >= 3.7),
 released with BSD license.
 """
 
@@ -14,16 +14,21 @@ __license__ = 'BSD'
 
 ## Chech the version
 import sys
-if sys.version_info < (3, 3):
-    raise StandardError('You must use python 3.3 or greater')
+if sys.version_info < (3, 7):
+    raise RuntimeError('You must use python 3.7 or greater')
     
 
-import socket, copy
+import socket
 import xml.etree.ElementTree as ET
 import string, urllib3
 from html.parser import HTMLParser
 from xml.sax.saxutils import unescape
-import os
+import bz2, codecs, glob, io, os, re, threading, time, zlib
+import asyncio, collections, concurrent.futures, hashlib, heapq, itertools, json, sqlite3, weakref
+try:
+    import lzma
+except ImportError:   # python built without liblzma
+    lzma = None
 
 class NLUliteHTMLParser(HTMLParser):
     """
@@ -32,7 +37,7 @@ class NLUliteHTMLParser(HTMLParser):
     def __init__(self):
         HTMLParser.__init__(self)
         self.current_tag = ''
-        self.all_text = ''
+        self.all_text = []
 
     def handle_starttag(self, tag, attrs):
         self.current_tag= tag
@@ -40,10 +45,10 @@ class NLUliteHTMLParser(HTMLParser):
     def handle_data(self, data):
         tag= self.current_tag
         if tag != 'script' and tag != 'img':
-            self.all_text += data
+            self.all_text.append(data)
 
     def get_all_text(self):
-        return self.all_text
+        return ''.join(self.all_text)
 
 class NLUliteWikiParser(HTMLParser):
     """
@@ -52,7 +57,7 @@ class NLUliteWikiParser(HTMLParser):
     def __init__(self):
         HTMLParser.__init__(self)
         self.current_tag = ''
-        self.all_text = ''
+        self.all_text = []
         self.p_tag = False
 
     def handle_starttag(self, tag, attrs):
@@ -64,15 +69,15 @@ class NLUliteWikiParser(HTMLParser):
         self.current_tag= tag
         if tag == 'p':
             self.p_tag = False
-            self.all_text += '\n'            
+            self.all_text.append('\n')
 
     def handle_data(self, data):
         tag= self.current_tag
         if self.p_tag:
-            self.all_text += data
+            self.all_text.append(data)
 
     def get_all_text(self):
-        return self.all_text
+        return ''.join(self.all_text)
 
 
 class HTMLTemplateFactory():
@@ -94,25 +99,41 @@ class NLUliteFeedParser(HTMLParser):
     def __init__(self):
         HTMLParser.__init__(self)
         self.current_tag = ''
-        self.all_text = ''
+        self.all_text = []
         self.link = ''
+        self.items = []     # the text of every <item>, for FeedPoller
+        self.item = None
 
     def handle_starttag(self, tag, attrs):
         self.current_tag= tag
+        if tag == 'item' or tag == 'entry':
+            self.item = []
+
+    def handle_endtag(self, tag):
+        if (tag == 'item' or tag == 'entry') and self.item is not None:
+            self.items.append(''.join(self.item))
+            self.item = None
 
     def handle_data(self, data):
         tag= self.current_tag
+        text= []
         if tag == 'title':
-            data.replace("<![CDATA[", " ")
-            data.replace("]]>"," ")
+            data = data.replace("<![CDATA[", " ")
+            data = data.replace("]]>"," ")
             
-            self.all_text += '[% feed %]'
-            self.all_text += data + ' \r\n\r\n'
+            text.append('[% feed %]')
+            text.append(data + ' \r\n\r\n')
         if tag == 'description':
-            self.all_text += data + ' \r\n\r\n'
+            text.append(data + ' \r\n\r\n')
+        self.all_text.extend(text)
+        if self.item is not None:
+            self.item.extend(text)
 
     def get_all_text(self):
-        return self.all_text
+        return ''.join(self.all_text)
+
+    def get_items(self):
+        return self.items
 
 
 class FeedTemplateFactory():
@@ -128,6 +149,8 @@ class Rule:
     """
     Store one single rule item
     """
+    __slots__ = ('text', 'description', 'weight')
+
     def __init__(self):
         self.text= ''
         self.description= ''
@@ -137,6 +160,8 @@ class QPair:
     """
     Store the query/reply combination in an answer
     """
+    __slots__ = ('query', 'reply')
+
     def __init__(self, query='', reply= ''):
         self.query= query
         self.reply= reply
@@ -144,8 +169,10 @@ class QPair:
 
 class AnswerElement:
     """
-    Store one single answer item
+    Store one single answer item. The weight is a number.
     """
+    __slots__ = ('text', 'description', 'drs', 'weight', 'pairs', 'rules', 'wisdom')
+
     def __init__(self):
         self.text= ''
         self.description= ''
@@ -156,7 +183,6 @@ class AnswerElement:
         self.wisdom = ''
 
     def comment(self):
-        writer = Writer(self.wisdom)
         return_string  = "\n"
         for pair in self.pairs:
             if pair.reply != None and pair.query != None:
@@ -171,17 +197,123 @@ class AnswerElement:
             return_string += self.text + "\n"
         return_string += "\n"
         return return_string
-        
+
+
+class AnswerElementView(AnswerElement):
+    """
+    Read-only view of an AnswerElement that shows only some of its pairs
+    (see Answer.elements()). All the other data are shared with the element.
+    """
+    __slots__ = ('element',)
+
+    def __init__(self, element, pairs):
+        object.__setattr__(self, 'element', element)
+        object.__setattr__(self, 'pairs', tuple(pairs))
+
+    def __getattr__(self, name):
+        if name == 'element':
+            raise AttributeError(name)
+        return getattr(self.element, name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('NLUlite.AnswerElementView is read-only')
+
 
 class Answer:
     """
     Store all the answer information
+
+    When the answer comes from the server, the reply is parsed lazily:
+    iterating over the answer builds the AnswerElements one at a time,
+    and reading 'status' stops the parsing as soon as the status is known.
+    The parsing is done under a lock, so the same answer can be read
+    from several threads.
     """
-    def __init__(self,wisdom):        
-        self.answer_elements= []
-        self.question_ID= ''
+    __slots__ = ('__elements', '__question_ID', '__status', '__index', '__lock', 'wisdom', 'reader', 'cached', 'shards')
+
+    def __init__(self,wisdom,reader= None):
+        self.__elements= []
+        self.__index= None
+        self.__question_ID= ''
+        self.__status= ''
         self.wisdom= wisdom
-        self.status= ''
+        self.reader= reader
+        self.cached= False   # True if the reply came from the cache of another wisdom
+        self.shards= None    # the answers joined by ShardedWisdom
+        self.__lock= None
+        if reader is not None:
+            reader.elements= self.__elements
+            self.__lock= threading.Lock()
+
+    def __read__(self, until= None):
+        """
+        Go on parsing the reply until 'until(reader)' is true, or to the end
+        """
+        if self.reader is None:
+            return
+        with self.__lock:
+            reader= self.reader
+            if reader is None:
+                return   # another thread finished the parsing
+            try:
+                while until is None or not until(reader):
+                    if not reader.step():
+                        qID= (reader.qID or '').rstrip().lstrip()
+                        self.__question_ID= self.wisdom.ID + ':' + qID + ':' + str(self.__elements.__len__())
+                        self.__status= reader.status if reader.status is not None else ''
+                        self.reader= None
+                        return
+            except ET.ParseError:
+                # If the answer is not well-formed, choose a default answer
+                self.__elements= []
+                self.__question_ID= self.wisdom.ID + ':no_answer:0'
+                self.__status= ''
+                self.reader= None
+
+    def __iter__(self):
+        index= 0
+        while True:
+            if index < len(self.__elements):
+                yield self.__elements[index]
+                index += 1
+            elif self.reader is not None:
+                self.__read__(lambda reader : index < len(self.__elements))
+            else:
+                return
+
+    @property
+    def answer_elements(self):
+        self.__read__()
+        return self.__elements
+
+    @answer_elements.setter
+    def answer_elements(self, answer_elements):
+        self.__read__()
+        self.__elements= answer_elements
+        self.__index= None
+
+    @property
+    def question_ID(self):
+        self.__read__()
+        return self.__question_ID
+
+    @question_ID.setter
+    def question_ID(self, qID):
+        self.__read__()
+        self.__question_ID= qID
+
+    @property
+    def status(self):
+        self.__read__(lambda reader : reader.status is not None)
+        reader= self.reader
+        if reader is not None:
+            return reader.status
+        return self.__status
+
+    @status.setter
+    def status(self, status):
+        self.__read__()
+        self.__status= status
 
     def __sort__(self):
         self.answer_elements = sorted( self.answer_elements, key= lambda item : item.weight )
@@ -192,19 +324,41 @@ class Answer:
     def set_question_ID(self,qID):
         self.question_ID= qID
 
+    def __pair_index__(self):
+        """
+        Return a dictionary from each pair query to the list of
+        (element position, pair position, pair) with that query.
+        It is built once, and again only if the elements change.
+        """
+        elements= self.answer_elements
+        if self.__index is not None and self.__index[0] is elements and self.__index[1] == len(elements):
+            return self.__index[2]
+        index= {}
+        for position, item in enumerate(elements):
+            for pair_position, pair in enumerate(item.pairs):
+                index.setdefault(pair.query, []).append( (position, pair_position, pair) )
+        self.__index= (elements, len(elements), index)
+        return index
+
     def elements(self,query=""):
+        """
+        Return the answer elements. If 'query' is given, every element
+        is an AnswerElementView with only the pairs whose query contains
+        'query'.
+        """
         if query == "":
             return self.answer_elements
-        else:
-            return_list= []
-            for item in self.answer_elements:
-                new_item = copy.deepcopy(item)
-                new_item.pairs = []
-                for pair in item.pairs:
-                    if pair.query.find(query) != -1:
-                        new_item.pairs.append(pair)
-                return_list.append(new_item)
-            return return_list
+        index= self.__pair_index__()
+        keys= [key for key in index if key is not None and key.find(query) != -1]
+        selected= [[] for item in self.answer_elements]
+        for key in keys:
+            for position, pair_position, pair in index[key]:
+                selected[position].append( (pair_position, pair) )
+        if len(keys) > 1:
+            for pairs in selected:
+                pairs.sort(key= lambda item : item[0])
+        return [AnswerElementView(item, [pair for _, pair in pairs])
+                for item, pairs in zip(self.answer_elements, selected)]
 
     def is_positive(self):
         if self.status.find('yes') != -1 or self.status.find('list') != -1:
@@ -221,44 +375,115 @@ class Answer:
             return True
         return False
 
-    def match(self,text):
-        for item in self.answer_elements:
-            drs= item.drs
-            answer= self.wisdom.__match_drs_with_text__(drs,text)
-            if answer.is_positive():
-                return answer
-        ret_answ= self
-        ret_answ.answer_elements= []
-        ret_answ.question_ID= ''
-        ret_answ.status= ''
-        return ret_answ
+    def match(self,text,max_concurrency= 8):
+        """
+        Match 'text' with the DRS of every element and return the first
+        positive answer, in the order of the elements, or an empty answer.
+
+        Up to 'max_concurrency' matches are sent at the same time; when
+        one is positive, the matches not yet sent are cancelled.
+        """
+        self.__check_sync__('match', 'AsyncWisdom.match_answer()')
+        elements= self.answer_elements
+        match= lambda item : self.wisdom.__match_drs_with_text__(item.drs,text)
+        if max_concurrency <= 1 or len(elements) <= 1:
+            for item in elements:
+                answer= match(item)
+                if answer.is_positive():
+                    return answer
+            return Answer(self.wisdom)
+        workers= min(max_concurrency, len(elements))
+        with concurrent.futures.ThreadPoolExecutor(max_workers= workers) as executor:
+            futures= [executor.submit(match, item) for item in elements]
+            try:
+                for future in futures:
+                    answer= future.result()
+                    if answer.is_positive():
+                        return answer
+            finally:
+                for future in futures:
+                    future.cancel()
+        return Answer(self.wisdom)
 
     def comment(self):
-        writer = Writer(self.wisdom)
-        return writer.write(self)
+        self.__check_sync__('comment', 'AsyncWriter.write()')
+        return self.wisdom.writer_pool.write(self)
+
+    def __check_sync__(self, method, instead):
+        if isinstance(self.wisdom, (AsyncWisdom, AsyncWikidata)):
+            raise TypeError('Answer.' + method + '() cannot be used on the answers of ' + type(self.wisdom).__name__ + ': use ' + instead + ' instead')
 
     def join(self,rhs):
-        if self.is_positive() and rhs.is_list():
-            self.status      = rhs.status
-            self.question_ID = rhs.question_ID
-            self.wisdom      = rhs.wisdom
-        if self.is_negative() and rhs.is_positive():
-            self.status      = rhs.status
-            self.question_ID = rhs.question_ID
-            self.wisdom      = rhs.wisdom
-        self.answer_elements.extend(rhs.answer_elements)
-        self.__sort__()
+        join_answers([self, rhs])
         
         
-def join_answers(answer_list) :
+def join_answers(answer_list, dedup= False, top_k= None) :
     """
-    Joins together and sorts a list of answers
+    Joins together and sorts a list of answers, into the first one.
+
+    The elements of the answers are merged by weight with a k-way merge.
+    If 'dedup' is True, the elements with the same DRS (or the same text,
+    when there is no DRS) are kept only once. If 'top_k' is given, only
+    the first 'top_k' elements are kept.
     """
     answers = answer_list[0]
+# The status comes from the answer that a sequence of Answer.join() would choose
+    chosen  = answers
     for item in answer_list[1:] :
-        answers.join(item)
+        if chosen.is_positive() and item.is_list():
+            chosen = item
+        if chosen.is_negative() and item.is_positive():
+            chosen = item
+    weight   = lambda item : item.weight
+    elements = heapq.merge(*[sorted(item.answer_elements, key= weight) for item in answer_list], key= weight)
+    if dedup:
+        elements = unique_elements(elements)
+    if top_k is not None:
+        elements = itertools.islice(elements, top_k)
+    answers.answer_elements = list(elements)
+    if chosen is not answers:
+        answers.status      = chosen.status
+        answers.question_ID = chosen.question_ID
+        answers.wisdom      = chosen.wisdom
     return answers
 
+def unique_elements(elements):
+    """
+    Auxiliary function for join_answers(): skips the elements already seen
+    """
+    seen = set()
+    for item in elements:
+        key = item.drs if item.drs else item.text
+        if key in seen:
+            continue
+        seen.add(key)
+        yield item
+
+def run_concurrently(function, items, max_concurrency= 8):
+    """
+    Calls function(item) for every item using at most 'max_concurrency'
+    threads, and returns the results in the same order as the items.
+    When a call raises an exception, the exception takes the place of
+    its result and the other calls go on.
+    """
+    items = list(items)
+    errors = {}
+    def call(index):
+        # The exception is not the result of the future: its traceback
+        # leads back to the worker, and the cycle would keep the objects
+        # of the call alive until the garbage collector runs
+        try:
+            return function(items[index])
+        except Exception as e:
+            errors[index] = e
+    if max_concurrency <= 1 or len(items) <= 1:
+        results = [call(index) for index in range(len(items))]
+    else:
+        workers = min(max_concurrency, len(items))
+        with concurrent.futures.ThreadPoolExecutor(max_workers= workers) as executor:
+            results = list(executor.map(call, range(len(items))))
+    return [errors.pop(index) if index in errors else result for index, result in enumerate(results)]
+
 class WisdomParameters:
     def __init__(self):
         self.num_answers    = 10
@@ -364,172 +589,1120 @@ class WisdomParameters:
 def process_query_reply(wisdom,reply):
     """
     Auxiliary function for the classes Wisdom and Wikidata.
-    It processes the reply from the server.
+    It processes the reply from the server. The reply is parsed only
+    when the Answer is used (see ReplyReader).
     """
-
-    answer_elements= []
     if reply == "":
-        return Answer(self)
-            
-    root= ''
+        return Answer(wisdom)
+    return Answer(wisdom, ReplyReader(wisdom, reply))
+
+
+class ReplyReader:
+    """
+    Helper class for Answer: it parses the reply from the server one
+    chunk at a time, and appends the AnswerElements to 'elements'
+    """
+    CHUNKLEN= 16384
 
+    def __init__(self, wisdom, reply):
+        self.wisdom= wisdom
+        self.reply= reply
+        self.position= 0
+        self.parser= ET.XMLPullParser(events= ('start',))
+        self.root= None
+        self.qID= None
+        self.status= None
+        self.elements= []
+
+    def step(self):
+        """
+        Parse the next chunk of the reply. Return False when the reply is
+        over; raise ET.ParseError if it is not well-formed.
+        """
+        if self.position < len(self.reply):
+            self.parser.feed(self.reply[self.position:self.position + self.CHUNKLEN])
+            self.position += self.CHUNKLEN
+            more= True
+        else:
+            self.parser.close()
+            more= False
+        for event, child in self.parser.read_events():
+            if self.root is None:
+                self.root= child
+        if self.root is None:
+            return more
+# All the children of the root are complete, but the last one might still be in the parser
+        done= len(self.root) - 1 if more else len(self.root)
+        for child in self.root[:done]:
+            if child.tag == 'qID':
+                self.qID= child.text
+            elif child.tag == 'status':
+                self.status= child.text
+            else:
+                self.elements.append( process_answer_element(self.wisdom, child) )
+# The parsed children are not needed anymore
+        del self.root[:done]
+        return more
+
+
+def parse_weight(text):
+    """
+    Auxiliary function for process_answer_element().
+    The weights are numbers, so that the answers are sorted by value.
+    """
     try:
-        root= ET.fromstring(reply)
-    except ET.ParseError:
-        # If the answer is not well-formed, choose a default answer
-        answer= Answer(wisdom)
-        answer.set_question_ID(wisdom.ID + ':no_answer:' + str(answer_elements.__len__()) )
-        answer.status= ''
-        return answer            
-
-    qID= status= ''
-    for child in root: 
-        if child.tag == 'qID':
-            qID= child.text
-            continue
-        if child.tag == 'status':
-            status= child.text
-            continue
+        return float(text)
+    except (TypeError, ValueError):
+        return 1
 
-        text=''
-        link=''
-        drs=''
-        weight=1
-        pairs= []
-        rules= []
-            
-        for c2 in child:
-            if c2.tag == 'text':
-                text= c2.text
-            if c2.tag == 'link':
-                link= c2.text
-            if c2.tag == 'drs':
-                drs= c2.text
-            if c2.tag == 'weight':
-                weight= c2.text
-            if c2.tag == 'data':
-                for c3 in c2:    # <dataitem>
-                    WP= name= ''
-                    for c4 in c3:
-                        if c4.tag == 'WP':
-                            WP= c4.text
-                        if c4.tag == 'name':
-                            name= c4.text
-                    pairs.append( QPair(WP,name) )
-            if c2.tag == 'rules':
-                for c3 in c2:   # <ruleitem>
-                    rule = Rule()                        
-                    for c4 in c3:
-                        if c4.tag == 'text':
-                            rule.text = c4.text
-                        if c4.tag == 'link':
-                            rule.description= c4.text
-                    rules.append( rule )
-
-        answ= AnswerElement()
-        answ.text   = text
-        answ.description = link
-        answ.drs    = drs
-        answ.weight = weight
-        answ.pairs  = pairs
-        answ.rules  = rules
-        answ.wisdom = wisdom
-        answer_elements.append( answ )
-            
-    answer= Answer(wisdom)
-    answer.set_elements(answer_elements)
-    answer.set_question_ID(wisdom.ID + ':' + qID.rstrip().lstrip() + ':' + str(answer_elements.__len__()) )
-    answer.status= status
+def process_answer_element(wisdom, child):
+    """
+    Auxiliary function for ReplyReader.
+    It builds the AnswerElement of one item of the reply.
+    """
+    text=''
+    link=''
+    drs=''
+    weight=1
+    pairs= []
+    rules= []
+
+    for c2 in child:
+        if c2.tag == 'text':
+            text= c2.text
+        if c2.tag == 'link':
+            link= c2.text
+        if c2.tag == 'drs':
+            drs= c2.text
+        if c2.tag == 'weight':
+            weight= parse_weight(c2.text)
+        if c2.tag == 'data':
+            for c3 in c2:    # <dataitem>
+                WP= name= ''
+                for c4 in c3:
+                    if c4.tag == 'WP' and c4.text is not None:
+                        WP= sys.intern(c4.text)
+                    if c4.tag == 'name':
+                        name= c4.text
+                pairs.append( QPair(WP,name) )
+        if c2.tag == 'rules':
+            for c3 in c2:   # <ruleitem>
+                rule = Rule()                        
+                for c4 in c3:
+                    if c4.tag == 'text':
+                        rule.text = c4.text
+                    if c4.tag == 'link':
+                        rule.description= c4.text
+                rules.append( rule )
+
+    answ= AnswerElement()
+    answ.text   = text
+    answ.description = link
+    answ.drs    = drs
+    answ.weight = weight
+    answ.pairs  = pairs
+    answ.rules  = rules
+    answ.wisdom = wisdom
+    return answ
+
+
+def wisdom_parameters_request(ID, wp):
+    """
+    Auxiliary function for the classes ServerProxy and AsyncServerProxy.
+    It writes the request that sets the WisdomParameters 'wp'.
+    """
+    accuracy_level = wp.get_accuracy_level()
+    num_answers    = wp.get_num_answers()
+    solver_options = wp.get_solver_options()
+    skip_presuppositions = wp.get_skip_presuppositions()
+    skip_solver = wp.get_skip_solver()
+    do_solver   = wp.get_do_solver()
+    add_data    = wp.get_add_data()
+    timeout     = wp.get_timeout()
+    fixed_time  = wp.get_fixed_time()
+    max_refs            = wp.get_max_refs()
+    max_candidates_refs = wp.get_max_candidates_refs()
+    max_candidates      = wp.get_max_candidates()
+    word_intersection = wp.get_word_intersection()
+    use_pertaynims    = wp.get_use_pertaynims()
+    use_synonyms      = wp.get_use_synonyms()
+    use_hyponyms      = wp.get_use_hyponyms()
+    num_hyponyms      = wp.get_num_hyponyms()
+    load_clauses      = wp.get_load_clauses()
+    implicit_verb     = wp.get_implicit_verb()
+    text = ('<wisdom_parameters ' 
+            + ' accuracy_level=' + str(accuracy_level) 
+            + ' num_answers='    + str(num_answers) 
+            + ' solver_options=' + solver_options 
+            + ' skip_presuppositions=' + skip_presuppositions 
+            + ' skip_solver=' + skip_solver 
+            + ' do_solver='   + do_solver 
+            + ' add_data='    + add_data 
+            + ' ID='          + ID
+            + ' timeout='     + str(timeout)
+            + ' fixed_time='  + str(fixed_time)
+            + ' max_refs='    + str(max_refs)
+            + ' max_candidates_refs=' + str(max_candidates_refs)
+            + ' max_candidates='      + str(max_candidates)
+            + ' word_intersection='   + word_intersection
+            + ' use_pertaynims='      + use_pertaynims
+            + ' use_synonyms='        + use_synonyms
+            + ' use_hyponyms='        + use_hyponyms
+            + ' num_hyponyms='        + str(num_hyponyms)
+            + ' implicit_verb='       + implicit_verb
+            + '>'
+    )
+    return text
+
+
+def read_response(response, chunk_size= 65536):
+    """
+    Auxiliary function for get_url_text() and get_feed_text().
+    It yields the body of an HTTP response as text, one chunk at a time,
+    decoded with the charset declared by the server (UTF-8 by default).
+    """
+    charset = 'utf-8'
+    match = re.search(r'charset=["\']?([\w.:-]+)', response.headers.get('Content-Type', ''), re.I)
+    if match:
+        charset = match.group(1)
+    try:
+        decoder = codecs.getincrementaldecoder(charset)(errors= 'replace')
+    except LookupError:
+        decoder = codecs.getincrementaldecoder('utf-8')(errors= 'replace')
+    try:
+        for chunk in response.stream(chunk_size):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b'', True)
+        if text:
+            yield text
+    finally:
+        response.release_conn()
+
+def unescape_chunks(chunks):
+    """
+    Auxiliary function for get_feed_text(). It unescapes the text chunks,
+    also when an entity ('&amp;', '&lt;', '&gt;') is split between two chunks.
+    """
+    rest = ''
+    for chunk in chunks:
+        chunk = rest + chunk
+        rest = ''
+        position = chunk.find('&', max(0, len(chunk) - 4))
+        if position != -1 and chunk.find(';', position) == -1:
+            rest = chunk[position:]
+            chunk = chunk[:position]
+        yield unescape(chunk)
+    if rest:
+        yield unescape(rest)
+
+def get_url_text(url, http= None):
+    """
+    Auxiliary function for the classes Wisdom and AsyncWisdom.
+    It downloads a web page and returns its text. The page is parsed
+    while it is downloaded. 'http' is the urllib3.PoolManager to use.
+    """
+    if http is None:
+        http = urllib3.PoolManager()
+    req = http.request('GET', url, preload_content= False)
+    if(req.status != 200):
+        req.release_conn()
+        raise RuntimeError('The page was not found')
+    parser = HTMLTemplateFactory().get(url)
+    for page in read_response(req):
+        parser.feed( page )
+    parser.close()
+    webtext = parser.get_all_text()
+    webtext = '[% '+url+' %]\n' + webtext
+    return webtext
 
-    return answer
+def get_feed_text(url, http= None):
+    """
+    Auxiliary function for the classes Wisdom and AsyncWisdom.
+    It downloads a feed and returns the text of its items. The feed is
+    parsed while it is downloaded. 'http' is the urllib3.PoolManager to use.
+    """
+    if http is None:
+        http = urllib3.PoolManager()
+    req = http.request('GET', url, preload_content= False)
+    if(req.status != 200):
+        req.release_conn()
+        raise RuntimeError('The feed was not found')
+    feeder = FeedTemplateFactory().get(url)
+    for page in unescape_chunks(read_response(req)):
+        feeder.feed(page)        
+    feeder.close()
+    text = feeder.get_all_text()
+    text = '[% '+url+' %]\n' + text
+    return text
+
+def read_file(filename):
+    """
+    Auxiliary function for the classes Wisdom, AsyncWisdom and FeedPoller.
+    """
+    f= open(filename, "r")
+    data= f.read()
+    f.close();
+    return data
+
+def write_file(filename, data):
+    """
+    Auxiliary function for the classes AsyncWisdom and FeedPoller.
+    """
+    f= open(filename, "w")
+    f.write(data);
+    f.close();
 
  
+def save_to_file(filename, save):
+    """
+    Auxiliary function for Wisdom.save() and Wisdom.save_rdf(). Call
+    save(f) with a temporary binary file, that replaces 'filename' only
+    if save() succeeds.
+    """
+    temporary = filename + '.part'
+    try:
+        with open(temporary, 'wb') as f:
+            save(f)
+        os.replace(temporary, filename)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+class DigestReader:
+    """
+    Helper class for Wisdom.load(): reads the binary file 'f' and keeps
+    the sha1 of what has been read, for the fingerprint of the wisdom.
+    """
+    def __init__(self, f):
+        self.file  = f
+        self.start = f.tell()
+        self.sha1  = hashlib.sha1()
+
+    def read(self, size= -1):
+        data = self.file.read(size)
+        self.sha1.update(data)
+        return data
+
+    def tell(self):
+        return 0
+
+    def seek(self, position):
+        # Only a restart from the beginning is possible
+        self.file.seek(self.start)
+        self.sha1 = hashlib.sha1()
+
+## Compressed snapshots: a header line, then the compressed wisdom
+SNAPSHOT_MAGIC   = b'NLUlite-snapshot '
+SNAPSHOT_VERSION = 1
+SNAPSHOT_CODECS  = {'zlib': (lambda: zlib.compressobj(6), zlib.decompressobj),
+                    'bz2' : (bz2.BZ2Compressor, bz2.BZ2Decompressor)}
+if lzma is not None:
+    SNAPSHOT_CODECS['lzma'] = (lzma.LZMACompressor, lzma.LZMADecompressor)
+
+def snapshot_header(codec, digest, params):
+    """
+    Auxiliary function for SnapshotWriter. The header has always the same
+    length for the same codec and params, so that it can be rewritten
+    when the sha256 'digest' is known.
+    """
+    header = {'version': SNAPSHOT_VERSION, 'codec': codec, 'sha256': digest, 'params': params}
+    return SNAPSHOT_MAGIC + json.dumps(header, sort_keys= True).encode('utf-8') + b'\n'
+
+def read_snapshot_header(f):
+    """
+    Auxiliary function for Wisdom.load() and Wisdom.load_string(). Return
+    the header of a compressed snapshot, with 'f' at the beginning of
+    the compressed data, or None (and 'f' unchanged) for a plain one.
+    """
+    start = f.tell()
+    if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+        f.seek(start)
+        return None
+    header = json.loads(f.readline().decode('utf-8'))
+    if header.get('version') != SNAPSHOT_VERSION or header.get('codec') not in SNAPSHOT_CODECS:
+        raise RuntimeError('Unsupported snapshot: version ' + str(header.get('version')) + ', codec ' + str(header.get('codec')))
+    return header
+
+class SnapshotWriter:
+    """
+    Helper class for Wisdom.save(): a binary file-like object that
+    compresses what is written to it into the file 'f'. The header is
+    completed by close().
+    """
+    def __init__(self, f, codec, params):
+        if codec not in SNAPSHOT_CODECS:
+            raise ValueError('Unknown compression: ' + str(codec) + ' (use one of ' + ', '.join(sorted(SNAPSHOT_CODECS)) + ')')
+        self.file   = f
+        self.codec  = codec
+        self.params = params
+        self.start  = f.tell()
+        self.seek(0)
+
+    def write(self, data):
+        self.digest.update(data)
+        self.file.write(self.compressor.compress(data))
+
+    def tell(self):
+        return 0
+
+    def seek(self, position):
+        # Only a restart from the beginning is possible
+        self.file.seek(self.start)
+        self.file.truncate()
+        self.file.write(snapshot_header(self.codec, '0'*64, self.params))
+        self.compressor = SNAPSHOT_CODECS[self.codec][0]()
+        self.digest = hashlib.sha256()
+
+    def truncate(self):
+        pass
+
+    def close(self):
+        self.file.write(self.compressor.flush())
+        end = self.file.tell()
+        self.file.seek(self.start)
+        self.file.write(snapshot_header(self.codec, self.digest.hexdigest(), self.params))
+        self.file.seek(end)
+
+class SnapshotReader:
+    """
+    Helper class for Wisdom.load(): a binary file-like object that reads
+    the decompressed wisdom from the file 'f', after its header. verify()
+    checks the sha256 of what has been read.
+    """
+    def __init__(self, f, header, chunk_size= 65536):
+        self.file   = f
+        self.header = header
+        self.chunk_size = chunk_size
+        self.start  = f.tell()
+        self.seek(0)
+
+    def read(self, size= -1):
+        if size is None or size < 0:
+            size = self.chunk_size
+        while not self.decompressor.eof:
+            if self.header['codec'] == 'zlib':   # zlib keeps the input it did not use
+                data = self.decompressor.unconsumed_tail or self.file.read(self.chunk_size)
+                needs_input = True
+            else:
+                needs_input = self.decompressor.needs_input
+                data = self.file.read(self.chunk_size) if needs_input else b''
+            if needs_input and not data:
+                raise RuntimeError('The snapshot is truncated')
+            out = self.decompressor.decompress(data, size)
+            if out:
+                self.digest.update(out)
+                self.sha1.update(out)
+                return out
+        return b''
+
+    def tell(self):
+        return 0
+
+    def seek(self, position):
+        self.file.seek(self.start)
+        self.decompressor = SNAPSHOT_CODECS[self.header['codec']][1]()
+        self.digest = hashlib.sha256()
+        self.sha1   = hashlib.sha1()   # for the fingerprint of the wisdom
+
+    def verify(self):
+        if self.digest.hexdigest() != self.header['sha256']:
+            raise RuntimeError('The snapshot is corrupted: its content does not match the sha256 in its header')
+
+def read_batches(filename, batch_size, offset= 0):
+    """
+    Auxiliary function for Wisdom.add_file(). Yield the text of the file
+    from 'offset' in batches of at most 'batch_size' bytes, together with
+    the offset where every batch ends. The batches end at a paragraph, a
+    sentence or a line if possible, and never inside a UTF-8 character.
+    """
+    with open(filename, 'rb') as f:
+        f.seek(offset)
+        buffer = b''
+        while True:
+            data = f.read(batch_size)
+            buffer += data
+            while len(buffer) > batch_size + 3:  # room for a whole character
+                for separator in (b'\n\n', b'. ', b'\n'):
+                    cut = buffer.rfind(separator, 0, batch_size)
+                    if cut > 0:
+                        cut += len(separator)
+                        break
+                else:
+                    cut = batch_size
+                    while cut > 0 and buffer[cut] & 0xC0 == 0x80:
+                        cut -= 1
+                    while cut == 0 or buffer[cut] & 0xC0 == 0x80:
+                        cut += 1
+                offset += cut
+                yield buffer[:cut].decode('utf-8'), offset
+                buffer = buffer[cut:]
+            if not data:
+                if buffer:
+                    yield buffer.decode('utf-8'), offset + len(buffer)
+                return
+
+
+class AnswerCache:
+    """
+    Bounded cache of the server replies to Wisdom.ask(), Wisdom.match()
+    and Wikidata.ask().
+
+    The least recently used replies are evicted when there are more than
+    'max_entries' of them or when they take more than 'max_bytes'
+    characters. If 'ttl' is set, the replies expire after 'ttl' seconds.
+    The same cache can be shared by several wisdoms.
+    """
+    def __init__(self, max_entries= 1000, max_bytes= 16*1024*1024, ttl= None):
+        self.max_entries = max_entries
+        self.max_bytes   = max_bytes
+        self.ttl         = ttl
+        self.entries = collections.OrderedDict()   # key -> (reply, time)
+        self.size    = 0
+        self.hits    = 0
+        self.misses  = 0
+        self.lock    = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is not None and self.ttl is not None and time.time() - item[1] > self.ttl:
+                self.__remove__(key)
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, reply):
+        if len(reply) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.__remove__(key)
+            self.entries[key] = (reply, time.time())
+            self.size += len(reply)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self.__remove__(next(iter(self.entries)))
+
+    def invalidate(self, fingerprint):
+        """
+        Remove all the replies for the wisdom content with this fingerprint
+        """
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == fingerprint]:
+                self.__remove__(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def __remove__(self, key):
+        reply, _ = self.entries.pop(key)
+        self.size -= len(reply)
+
+
+class SqliteAnswerCache:
+    """
+    Persistent version of AnswerCache, stored in a sqlite3 database.
+    The replies are keyed by the fingerprint of the wisdom content (see
+    Wisdom.fingerprint), so a new process that adds or loads the same
+    data finds the replies of the previous ones. For the same reason
+    invalidate() keeps the replies: they are still valid for that content.
+    Several processes can share the same file: the number and the size
+    of the replies are kept by triggers in a one-row table, and the limits
+    are checked inside the transaction that adds a reply. The least
+    recently used replies are evicted in batches of 'evict_batch' (at
+    most a sixteenth of 'max_entries').
+    Call compact() from time to time to give the free space back.
+    """
+    def __init__(self, filename, max_entries= 100000, max_bytes= 256*1024*1024, ttl= None, evict_batch= 64):
+        self.max_entries = max_entries
+        self.max_bytes   = max_bytes
+        self.ttl         = ttl
+        self.evict_batch = evict_batch
+        self.hits    = 0
+        self.misses  = 0
+        self.lock    = threading.Lock()
+        # The transactions are explicit (isolation_level= None)
+        self.connection = sqlite3.connect(os.path.expanduser(filename), check_same_thread= False,
+                                          isolation_level= None, timeout= 30)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS answers '
+                                    '(key TEXT PRIMARY KEY, reply TEXT, size INTEGER, created REAL, used REAL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS answers_used ON answers (used)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS answers_total '
+                                    '(id INTEGER PRIMARY KEY CHECK (id = 0), entries INTEGER, size INTEGER)')
+            # The totals of a database written by an older version are counted once
+            self.connection.execute('INSERT OR IGNORE INTO answers_total '
+                                    'SELECT 0, COUNT(*), TOTAL(size) FROM answers')
+            self.connection.execute('CREATE TRIGGER IF NOT EXISTS answers_insert AFTER INSERT ON answers BEGIN '
+                                    'UPDATE answers_total SET entries = entries + 1, size = size + NEW.size WHERE id = 0; END')
+            self.connection.execute('CREATE TRIGGER IF NOT EXISTS answers_delete AFTER DELETE ON answers BEGIN '
+                                    'UPDATE answers_total SET entries = entries - 1, size = size - OLD.size WHERE id = 0; END')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+    def __totals__(self):
+        entries, size = self.connection.execute('SELECT entries, size FROM answers_total').fetchone()
+        return entries, int(size)
+
+    @property
+    def entries(self):
+        return self.__totals__()[0]
+
+    @property
+    def size(self):
+        return self.__totals__()[1]
+
+    def get(self, key):
+        key = repr(key)
+        with self.lock:
+            row = self.connection.execute('SELECT reply, created FROM answers WHERE key = ?', (key,)).fetchone()
+            if row is not None and self.ttl is not None and time.time() - row[1] > self.ttl:
+                self.connection.execute('DELETE FROM answers WHERE key = ?', (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.connection.execute('UPDATE answers SET used = ? WHERE key = ?', (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, reply):
+        if len(reply) > self.max_bytes:
+            return
+        key = repr(key)
+        now = time.time()
+        with self.lock:
+            # BEGIN IMMEDIATE takes the write lock at once, so the totals
+            # read below stay true until the evictions are committed.
+            # DELETE and INSERT (not INSERT OR REPLACE) so that the triggers run.
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                self.connection.execute('DELETE FROM answers WHERE key = ?', (key,))
+                self.connection.execute('INSERT INTO answers VALUES (?, ?, ?, ?, ?)', (key, reply, len(reply), now, now))
+                entries, size = self.__totals__()
+                while (entries > self.max_entries or size > self.max_bytes) and entries > 1:
+                    count = max(entries - self.max_entries, min(self.evict_batch, self.max_entries // 16), 1)
+                    self.connection.execute('DELETE FROM answers WHERE key IN '
+                                            '(SELECT key FROM answers WHERE key != ? ORDER BY used LIMIT ?)', (key, count))
+                    entries, size = self.__totals__()
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+
+    def invalidate(self, fingerprint):
+        return
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute('DELETE FROM answers')
+
+    def compact(self):
+        """
+        Remove the expired replies and shrink the database file
+        """
+        with self.lock:
+            if self.ttl is not None:
+                self.connection.execute('DELETE FROM answers WHERE created < ?', (time.time() - self.ttl,))
+            self.connection.execute('VACUUM')
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+EMPTY_FINGERPRINT = hashlib.sha1(b'').hexdigest()
+
+def chain_fingerprint(fingerprint, digest):
+    """
+    Auxiliary function for the class Wisdom: the fingerprint after a
+    change with this digest. An unknown content (None) stays unknown.
+    """
+    if fingerprint is None:
+        return None
+    return hashlib.sha1((fingerprint + digest).encode('utf-8')).hexdigest()
+
+def cached_request(wisdom, command, question):
+    """
+    Auxiliary function for the classes Wisdom and Wikidata.
+    It sends the question with the ServerProxy method 'command', unless
+    the reply is already in the cache of the wisdom. Return the reply and
+    whether it came from the cache of another wisdom (see Answer.cached).
+
+    The key contains the server address, since the same content on another
+    server is another wisdom. Nothing is cached while the content of the
+    wisdom is not known (a fingerprint of None, as after an import).
+    The reply is stored after the line 'server/wisdom ID' of the wisdom
+    that asked it, since its question ID is known only to that wisdom.
+    """
+    fingerprint = wisdom.fingerprint
+    if wisdom.cache is None or fingerprint is None:
+        return getattr(wisdom.server, command)(question, wisdom.ID), False
+    server = wisdom.server.ip + ':' + str(wisdom.server.port)
+    origin = server + '/' + wisdom.ID
+    key = (fingerprint, server, command, ' '.join(question.split()), wisdom.parameters)
+    value = wisdom.cache.get(key)
+    if value is not None:
+        cached_origin, _, reply = value.partition('\n')
+        return reply, cached_origin != origin
+    generation = wisdom.generation
+    reply = getattr(wisdom.server, command)(question, wisdom.ID)
+    # Do not store a reply if the wisdom changed while it was computed
+    if reply != '' and generation == wisdom.generation:
+        wisdom.cache.put(key, origin + '\n' + reply)
+    return reply, False
+
+
+class DedupFilter:
+    """
+    Removes from the text sent to Wisdom.add() the paragraphs that were
+    already sent.
+
+    Only an 8 byte hash of every paragraph is kept (with the whitespace
+    normalized). The hashes are saved to 'filename.dedup' by Wisdom.save()
+    and read back by Wisdom.load(). 'bytes_saved' and 'paragraphs_saved'
+    count what was not sent again.
+
+    The hashes of a text being added are reserved in 'pending', so that
+    concurrent adds of the same paragraph send it only once. They are
+    released by release() if the add fails.
+    """
+    def __init__(self):
+        self.hashes= set()
+        self.pending= set()
+        self.bytes_saved= 0
+        self.paragraphs_saved= 0
+        self.lock= threading.Lock()
+
+    def filter(self, text):
+        """
+        Return the text without the duplicated paragraphs, and what
+        must be passed to commit() once the text has been added (or to
+        release() if it could not be added).
+        """
+        tag = ''
+        match = re.match(r'\[%[^\n]*%\]\n', text)
+        if match:
+            tag = match.group(0)
+            text = text[match.end():]
+        kept= []
+        new_hashes= set()
+        saved= 0
+        duplicates= 0
+        with self.lock:
+            for paragraph in re.split(r'\n\s*\n', text):
+                if paragraph.strip() == '':
+                    continue
+                digest= hashlib.blake2b(' '.join(paragraph.split()).encode('utf-8'), digest_size= 8).digest()
+                key= int.from_bytes(digest, 'little')
+                if key in self.hashes or key in self.pending or key in new_hashes:
+                    saved += len(paragraph.encode('utf-8'))
+                    duplicates += 1
+                    continue
+                new_hashes.add(key)
+                kept.append(paragraph)
+            self.pending.update(new_hashes)
+        text = tag + '\n\n'.join(kept) if kept else ''
+        return text, (new_hashes, saved, duplicates)
+
+    def commit(self, state):
+        new_hashes, saved, duplicates = state
+        with self.lock:
+            self.pending.difference_update(new_hashes)
+            self.hashes.update(new_hashes)
+            self.bytes_saved += saved
+            self.paragraphs_saved += duplicates
+
+    def release(self, state):
+        new_hashes, saved, duplicates = state
+        with self.lock:
+            self.pending.difference_update(new_hashes)
+
+    def clear(self):
+        with self.lock:
+            self.hashes= set()
+
+    def save(self, filename):
+        with self.lock:
+            data= b''.join(key.to_bytes(8, 'little') for key in self.hashes)
+        with open(filename, 'wb') as f:
+            f.write(data)
+
+    def load(self, filename):
+        with open(filename, 'rb') as f:
+            data= f.read()
+        hashes= set(int.from_bytes(data[i:i+8], 'little') for i in range(0, len(data) - 7, 8))
+        with self.lock:
+            self.hashes= hashes
+
+
+class FileReport:
+    """
+    What Wisdom.add_directory() did with one file. 'error' is None if
+    the file was added, or the exception.
+    """
+    def __init__(self, filename, size= 0, seconds= 0, error= None):
+        self.filename = filename
+        self.size     = size
+        self.seconds  = seconds
+        self.error    = error
+
+    def __repr__(self):
+        return 'FileReport(%r, size=%d, seconds=%.3f, error=%r)' % (self.filename, self.size, self.seconds, self.error)
+
+
 class Wisdom:
     """
     Process the wisdom
+
+    If a 'cache' (an instance of NLUlite.AnswerCache or of
+    NLUlite.SqliteAnswerCache) is given, the replies to ask() and match()
+    are cached. The cache key contains the server address and the
+    fingerprint of the wisdom, a hash chain of all the data added or
+    loaded, so a change of the wisdom never gets an old reply. The content
+    of an imported wisdom is not known, so its replies are not cached
+    until clear() is called. The question ID of a cached answer belongs to
+    the wisdom that asked it first: an answer cached by another wisdom (or
+    another process) has Answer.cached set, and cannot be commented.
+
+    If 'dedup' is True, the paragraphs that were already added are not
+    sent to the server again (see NLUlite.DedupFilter, in Wisdom.dedup).
     """
-    def __init__(self, server):
+    def __init__(self, server, cache= None, dedup= False):
         if not isinstance(server, ServerProxy):
             raise TypeError('The server attribute must be set to an instance of NLUlite.ServerProxy')
         self.server= server
         self.ID= self.server.get_new_ID()
+        self.cache= cache
+        self.dedup= DedupFilter() if dedup else None
+        self.parameters= ''  # the WisdomParameters in use, as a string
+        self.generation= 0   # it grows every time the wisdom is changed
+        self.fingerprint= EMPTY_FINGERPRINT
+        self.batch= None     # [fingerprint before, depth, digests] while a batch of adds runs
+        self.writer_pool= WriterPool(self)
+        self.http= urllib3.PoolManager(maxsize= 8)  # shared by all the downloads
+        self.lock= threading.Lock()
 
     def __match_drs_with_text__(self,drs,question):
         reply = self.server.match_drs(drs,question,self.ID)
         answer= process_query_reply(self, reply)
         return answer
 
-    def add(self, text):    
-        reply = self.server.add_data(text, self.ID);
+    def __changed__(self, operation= None, data= '', digest= None):
+        """
+        Called after every change of the wisdom. The 'operation' and its
+        'data' (or the sha1 'digest' of the data) are added to the
+        fingerprint chain, if given. During a batch they are added only
+        at its end (see __begin_batch__).
+        """
+        if operation is not None and digest is None:
+            if not isinstance(data, bytes):
+                data = data.encode('utf-8')
+            digest = hashlib.sha1(data).hexdigest()
+        with self.lock:
+            self.generation += 1
+            if self.cache is not None:
+                self.cache.invalidate(self.fingerprint)
+            if operation is not None:
+                if self.batch is not None:
+                    self.batch[2].append(operation + digest)
+                else:
+                    self.fingerprint = chain_fingerprint(self.fingerprint, operation + digest)
+
+    def __begin_batch__(self):
+        """
+        Auxiliary function for add_directory() and __add_many__(): their
+        adds end in thread completion order, so they are added to the
+        fingerprint chain in sorted order by __end_batch__(). Meanwhile
+        the content is not known and nothing is cached.
+        """
+        with self.lock:
+            if self.batch is None:
+                self.batch = [self.fingerprint, 0, []]
+                self.fingerprint = None
+            self.batch[1] += 1
+
+    def __end_batch__(self):
+        with self.lock:
+            self.batch[1] -= 1
+            if self.batch[1] > 0:
+                return
+            fingerprint, _, digests = self.batch
+            self.batch = None
+            if digests and self.cache is not None:
+                self.cache.invalidate(fingerprint)
+            for digest in sorted(digests):
+                fingerprint = chain_fingerprint(fingerprint, digest)
+            self.fingerprint = fingerprint
+
+    def __set_fingerprint__(self, fingerprint):
+        """
+        Set the fingerprint after clear(), or None when the content is not known
+        """
+        with self.lock:
+            if self.batch is not None:
+                # What was added before is gone: the batch goes on from here
+                self.batch[0] = fingerprint
+                self.batch[2] = []
+            else:
+                self.fingerprint = fingerprint
 
-    def add_file(self, filename):
+    def add(self, text):    
+        if self.dedup is not None:
+            text, state = self.dedup.filter(text)
+            if text == '':
+                self.dedup.commit(state)
+                return
+        try:
+            reply = self.server.add_data(text, self.ID);
+        except BaseException:
+            if self.dedup is not None:
+                self.dedup.release(state)
+            raise
+        if self.dedup is not None:
+            self.dedup.commit(state)
+        self.__changed__('add', text)
+
+    def add_file(self, filename, batch_size= None, progress= None, offset= 0):
+        """
+        If 'batch_size' is given, the file is read and sent in batches of
+        about 'batch_size' bytes, split at paragraphs or sentences. The next
+        batch is read while the previous one is being added. After every
+        batch progress(offset, size) is called, with the byte offset reached;
+        an interrupted file can be resumed by passing that 'offset' back.
+        Return the offset reached.
+        """
         filename = os.path.expanduser(filename)
-        text = open(filename, 'r').read()
-        reply = self.server.add_data(text, self.ID);
+        if batch_size is None and offset == 0:
+            text = open(filename, 'r').read()
+            self.add(text)
+            return os.path.getsize(filename)
+        size = os.path.getsize(filename)
+        with concurrent.futures.ThreadPoolExecutor(max_workers= 1) as executor:
+            pending = None
+            for text, end in read_batches(filename, batch_size or size or 1, offset):
+                if pending is not None:
+                    self.__batch_done__(pending, progress, size)
+                pending = (executor.submit(self.add, text), end)
+            if pending is not None:
+                offset = self.__batch_done__(pending, progress, size)
+        return offset
+
+    def add_directory(self, path, pattern= '*.txt', workers= 4, tags= False):
+        """
+        Add all the files in 'path' matching 'pattern' ('**' matches the
+        subdirectories too). 'workers' files are read and sent at a time,
+        each one on its own pooled connection. If 'tags' is True, every
+        file begins with its '[% filename %]' source tag, as add_url() does.
+        Return a list of NLUlite.FileReport, one for every file.
+        The fingerprint does not depend on the order the files are added in.
+        """
+        path = os.path.expanduser(path)
+        filenames = sorted(filename for filename in glob.glob(os.path.join(path, pattern), recursive= True)
+                           if os.path.isfile(filename))
+        def add(filename):
+            report = FileReport(filename)
+            start  = time.time()
+            try:
+                report.size = os.path.getsize(filename)
+                text = read_file(filename)
+                if tags:
+                    text = '[% '+filename+' %]\n' + text
+                self.add(text)
+            except Exception as e:
+                report.error = e
+            report.seconds = time.time() - start
+            return report
+        self.__begin_batch__()
+        try:
+            return run_concurrently(add, filenames, workers)
+        finally:
+            self.__end_batch__()
+
+    def __batch_done__(self, pending, progress, size):
+        future, end = pending
+        future.result()
+        if progress is not None:
+            progress(end, size)
+        return end
 
     def add_url(self, url):
-        http = urllib3.PoolManager()
-        req = http.request('GET',url) 
-        if(req.status != 200):
-            raise RuntimeError('The page was not found')
-        page= str( req.data )
-        parser = HTMLTemplateFactory().get(url)
-        parser.feed( page )
-        webtext = parser.get_all_text()
-        webtext = '[% '+url+' %]\n' + webtext
+        webtext = get_url_text(url, self.http)
         self.add(webtext)
 
     def add_feed(self, url):
-        http = urllib3.PoolManager()
-        req = http.request('GET',url) 
-        page= str(req.data)
-        page = unescape( page )
-        feeder = FeedTemplateFactory().get(url)
-        feeder.feed(page)        
-        text = feeder.get_all_text()
-        text = '[% '+url+' %]\n' + text
+        text = get_feed_text(url, self.http)
         self.add(text)
 
-    def save(self, filename):
+    def add_urls(self, urls, max_concurrency= 8, max_per_host= 2):
+        """
+        Add many web pages as add_url() does. The pages are downloaded and
+        parsed in parallel (at most 'max_per_host' at a time from the same
+        host), and each one is sent to the server as soon as it is ready.
+        Return a list with None for every page added, or the exception.
+        The fingerprint does not depend on the order the pages are added in.
+        """
+        return self.__add_many__(get_url_text, urls, max_concurrency, max_per_host)
+
+    def add_feeds(self, urls, max_concurrency= 8, max_per_host= 2):
+        """
+        The same as add_urls(), for add_feed()
+        """
+        return self.__add_many__(get_feed_text, urls, max_concurrency, max_per_host)
+
+    def __add_many__(self, download, urls, max_concurrency, max_per_host):
+        hosts = {}
+        lock  = threading.Lock()
+        def add(url):
+            host = urllib3.util.parse_url(url).host
+            with lock:
+                semaphore = hosts.setdefault(host, threading.BoundedSemaphore(max_per_host))
+            with semaphore:
+                text = download(url, self.http)
+            self.add(text)
+        self.__begin_batch__()
+        try:
+            return run_concurrently(add, urls, max_concurrency)
+        finally:
+            self.__end_batch__()
+
+    def save(self, filename, compression= None):
+        """
+        The wisdom is written to the file while it is received from the
+        server, so it is never all in memory.
+
+        If 'compression' is 'zlib', 'bz2' or 'lzma' the file is a compressed
+        snapshot, with a header (format version, codec, sha256 of the
+        content and the wisdom parameters). load() recognizes both formats;
+        it checks the sha256 after the load, and clears the wisdom if the
+        snapshot is corrupted.
+        """
         filename = os.path.expanduser(filename)
-        reply = self.server.save_wisdom(self.ID);
-        f= open(filename, "w")
-        f.write(reply);
-        f.close();
+        if compression is None:
+            save_to_file(filename, lambda f: self.server.save_wisdom_to(self.ID, f))
+        else:
+            save_to_file(filename, lambda f: self.__save_snapshot__(f, compression))
+        if self.dedup is not None:
+            self.dedup.save(filename + '.dedup')
+
+    def __save_snapshot__(self, f, compression):
+        writer = SnapshotWriter(f, compression, self.__snapshot_params__())
+        self.server.save_wisdom_to(self.ID, writer)
+        writer.close()
+
+    def __snapshot_params__(self):
+        return {'parameters': self.parameters,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'client': __version__}
 
     def save_rdf(self, filename):
         filename = os.path.expanduser(filename)
-        reply = self.server.save_rdf(self.ID);
-        f= open(filename, "w")
-        f.write(reply);
-        f.close();
+        save_to_file(filename, lambda f: self.server.save_rdf_to(self.ID, f))
 
 
-    def save_string(self):
-        reply = self.server.save_wisdom(self.ID);
-        return reply
+    def save_string(self, compression= None):
+        """
+        With 'compression' the snapshot is returned as bytes, as save()
+        writes it.
+        """
+        if compression is None:
+            reply = self.server.save_wisdom(self.ID);
+            return reply
+        f = io.BytesIO()
+        self.__save_snapshot__(f, compression)
+        return f.getvalue()
 
     def load(self, filename):        
+        """
+        The file is sent to the server while it is read (and decompressed,
+        for a compressed snapshot), so it is never all in memory.
+        """
         filename = os.path.expanduser(filename)
-        f= open(filename, "r")
-        data= f.read()
-        f.close();
-        reply = self.server.load_wisdom(data, self.ID);
+        with open(filename, 'rb') as f:
+            header = read_snapshot_header(f)
+            if header is None:
+                reader = DigestReader(f)
+                reply = self.server.load_wisdom_from(reader, self.ID);
+                self.__changed__('load', digest= reader.sha1.hexdigest())
+            else:
+                self.__load_snapshot__(f, header)
+        if self.dedup is not None:
+            if os.path.exists(filename + '.dedup'):
+                self.dedup.load(filename + '.dedup')
+            else:
+                self.dedup.clear()
 
     def load_string(self, string):
         data= string
-        reply = self.server.load_wisdom(data, self.ID);
+        if isinstance(data, bytes) and data.startswith(SNAPSHOT_MAGIC):
+            f = io.BytesIO(data)
+            self.__load_snapshot__(f, read_snapshot_header(f))
+        else:
+            reply = self.server.load_wisdom(data, self.ID);
+            self.__changed__('load', data)
+        if self.dedup is not None:
+            self.dedup.clear()  # the paragraphs in the string are not known
+
+    def __load_snapshot__(self, f, header):
+        """
+        The sha256 of a compressed snapshot can be checked only after its
+        content has been sent to the server. If the load fails or the
+        content does not match, the wisdom is cleared, so that no part of
+        a corrupted snapshot stays in it.
+        """
+        reader = SnapshotReader(f, header)
+        try:
+            reply = self.server.load_wisdom_from(reader, self.ID);
+            reader.verify()
+        except BaseException:
+            try:
+                self.clear()
+            except Exception:
+                # The server could not be reached: the content is not known
+                self.__changed__()
+                self.__set_fingerprint__(None)
+            raise
+        self.__changed__('load', digest= reader.sha1.hexdigest())
 
     def ask(self, question):
-        reply  = self.server.query(question, self.ID)
+        reply, cached = cached_request(self, 'query', question)
         answer = process_query_reply(self, reply)
+        answer.cached = cached
         return answer
 
     def match(self, question):
-        reply = self.server.match(question, self.ID)
+        reply, cached = cached_request(self, 'match', question)
         answer= process_query_reply(self, reply)
+        answer.cached = cached
         return answer
 
+    def ask_many(self, questions, max_concurrency= 8):
+        """
+        Ask all the questions, at most 'max_concurrency' at a time. The
+        answers are in the same order as the questions; a question that
+        failed has the exception in place of its answer.
+        """
+        return run_concurrently(self.ask, questions, max_concurrency)
+
+    def match_many(self, questions, max_concurrency= 8):
+        """
+        The same as ask_many(), for Wisdom.match()
+        """
+        return run_concurrently(self.match, questions, max_concurrency)
+
     def export_to_server(self,key,password="",timer=-1):
         reply = self.server.send_to_publish(self.ID, key, password,timer);
         if(reply == "<error>"):
@@ -539,10 +1712,28 @@ class Wisdom:
         reply = self.server.get_from_published(self.ID, key);
         if(reply == "<error>"):
             raise RuntimeError('Cannot retrieve wisdom: The key ' + key + ' does not exist')
+        self.__changed__()
+        self.writer_pool.close()  # the writers belong to the old ID
         self.ID= reply;  # This function erases the wisdom when succesful
+        self.__set_fingerprint__(None)  # the published content is not known here
+        if self.dedup is not None:
+            self.dedup.clear()
+
+    def close(self):
+        """
+        Erase the Writers of the wisdom from the server and close the
+        connections of its downloads. The wisdom itself stays on the server
+        until the ServerProxy is deleted.
+        """
+        self.writer_pool.close()
+        self.http.clear()
 
     def clear(self):
         reply = self.server.clear_wisdom(self.ID);
+        self.__changed__()
+        self.__set_fingerprint__(EMPTY_FINGERPRINT)
+        if self.dedup is not None:
+            self.dedup.clear()
         if(reply == "<error>"):
             raise RuntimeError('Cannot clear wisdom: The Wisdom.ID ' + self.ID + ' does not exist')
 
@@ -550,6 +1741,8 @@ class Wisdom:
         if not isinstance(wp, WisdomParameters):
             raise TypeError('The wisdom.set_wisdom_parameters attribute must be set to an instance of NLUlite.WisdomParameters')        
         self.server.set_wisdom_parameters(self.ID, wp);
+        self.parameters= repr(sorted(vars(wp).items()))
+        self.__changed__()
 
 class Writer:
     """
@@ -558,31 +1751,213 @@ class Writer:
     def __init__(self, wisdom):
         if not isinstance(wisdom, Wisdom) and not isinstance(wisdom, Wikidata):
             raise TypeError('The wisdom attribute must be set to an instance of NLUlite.Wisdom or NLUlite.wikidata')
+        self.wisdom = as_proxy(wisdom)  # the wisdom keeps its Writers: no cycle
         self.server = wisdom.server
         reply= self.server.get_new_writer_ID(wisdom.ID)
         self.ID= reply
 
     def __del__(self):
-        self.server.writer_erase(self.ID);
+        self.close()
+
+    def close(self):
+        """
+        Erase the writer from the server
+        """
+        ID= getattr(self, 'ID', None)
+        if ID is not None:
+            self.ID= None
+            self.server.writer_erase(ID);
 
     def write(self, answer):
         if isinstance(answer, AnswerElement):
             reply= self.server.writer_write(self.ID, answer.drs)
             return reply
         if isinstance(answer, Answer):
+            if answer.shards is not None:
+                raise RuntimeError('An answer joined from several shards cannot be commented: comment the answers in Answer.shards')
+            if answer.cached:
+                raise RuntimeError('The answer comes from the cache: its question ID is not known to this server')
             reply= self.server.writer_write_answer(self.ID, answer.question_ID)
             return reply
         raise TypeError('The answer attribute must be set to an instance of NLUlite.Anwer or NLUlite.AnswerElement')
 
+    def write_many(self, answers, max_concurrency= 8):
+        """
+        Write a list of Answers and AnswerElements, at most 'max_concurrency'
+        at a time, and return the strings in the same order. Elements with
+        the same DRS (and answers with the same question ID) are written
+        only once. An item that failed has the exception in place of its string.
+
+        A server-side writer is used by one thread at a time: this Writer
+        and, for the other workers, Writers borrowed from the wisdom's
+        WriterPool.
+        """
+        answers= list(answers)
+        keys= []
+        unique= {}
+        for answer in answers:
+            if isinstance(answer, AnswerElement):
+                key= ('drs', answer.drs)
+            elif isinstance(answer, Answer):
+                key= ('answer', answer.question_ID)
+            else:
+                key= ('object', id(answer))
+            keys.append(key)
+            unique.setdefault(key, answer)
+        free= [self]
+        borrowed= []
+        lock= threading.Lock()
+        def write(answer):
+            with lock:
+                writer= free.pop() if free else None
+            if writer is None:
+                writer= self.wisdom.writer_pool.get()
+                with lock:
+                    borrowed.append(writer)
+            try:
+                return writer.write(answer)
+            finally:
+                with lock:
+                    free.append(writer)
+        try:
+            replies= run_concurrently(write, unique.values(), max_concurrency)
+        finally:
+            for writer in borrowed:
+                self.wisdom.writer_pool.put(writer)
+        replies= dict(zip(unique.keys(), replies))
+        return [replies[key] for key in keys]
+
+
+def as_proxy(wisdom):
+    """
+    Auxiliary function for Writer and WriterPool: return a weak proxy of
+    the wisdom, so that a wisdom and its Writers do not keep each other alive
+    """
+    if type(wisdom) in weakref.ProxyTypes:
+        return wisdom
+    return weakref.proxy(wisdom)
+
+
+class WriterPool:
+    """
+    Keeps the Writers of a wisdom, so that writing an answer does not
+    create and erase a Writer on the server every time. The Writers are
+    created only when needed, and erased by close().
+    """
+    def __init__(self, wisdom):
+        self.wisdom= as_proxy(wisdom)  # the pool belongs to the wisdom: no cycle
+        self.writers= []
+        self.idle= []
+        self.lock= threading.Lock()
+
+    def get(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        writer= Writer(self.wisdom)
+        with self.lock:
+            self.writers.append(writer)
+        return writer
+
+    def put(self, writer):
+        with self.lock:
+            if writer in self.writers:
+                self.idle.append(writer)
+                return
+        writer.close()  # the pool was closed in the meantime
+
+    def write(self, answer):
+        writer= self.get()
+        try:
+            return writer.write(answer)
+        finally:
+            self.put(writer)
+
+    def close(self):
+        with self.lock:
+            writers= self.writers
+            self.writers= []
+            self.idle= []
+        for writer in writers:
+            writer.close()
+
             
+class ConnectionPool:
+    """
+    Helper class for ServerProxy: keeps the idle connections to the server
+    so that they can be reused by the following commands
+    """
+    def __init__(self, ip, port, size= 4, idle_timeout= 60, timeout= None):
+        self.ip   = ip
+        self.port = port
+        self.size = size                 # maximum number of idle connections kept
+        self.idle_timeout = idle_timeout # seconds after which an idle connection is dropped
+        self.timeout = timeout           # timeout of the socket operations (None = no timeout)
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def connect(self):
+        sock= socket.create_connection( (self.ip,self.port), self.timeout )
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        return sock
+
+    def get(self):
+        """
+        Return a (socket, reused) pair. Idle connections that are too old, or
+        that the server has closed in the meantime, are discarded.
+        """
+        now= time.time()
+        while True:
+            with self.lock:
+                if not self.idle:
+                    break
+                sock, last_used = self.idle.pop()
+            if now - last_used < self.idle_timeout and self.is_alive(sock):
+                sock.settimeout(self.timeout)
+                return sock, True
+            sock.close()
+        return self.connect(), False
+
+    def put(self, sock):
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append( (sock, time.time()) )
+                return
+        sock.close()
+
+    def is_alive(self, sock):
+        # An idle connection must have nothing to read: a readable socket
+        # means that the server closed it (or sent something unexpected).
+        # A non-blocking peek works for any file descriptor, while select()
+        # fails for the ones >= FD_SETSIZE. get() restores the timeout.
+        try:
+            sock.setblocking(False)
+            sock.recv(1, socket.MSG_PEEK)
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        return False
+
+    def close(self):
+        with self.lock:
+            idle = self.idle
+            self.idle = []
+        for sock, _ in idle:
+            sock.close()
+
+
 class ServerProxy:
     """
     Server class
     """
-    def __init__(self, ip= "localhost", port= 4001):
+    def __init__(self, ip= "localhost", port= 4001, pool_size= 4, idle_timeout= 60, recv_size= 65536, timeout= None):
 
         self.ip   = ip
         self.port = port
+        self.recv_size = recv_size   # size of the buffer for receiving the answers
+        self.pool = ConnectionPool(ip, port, pool_size, idle_timeout, timeout)
         self.wisdom_list= []
         self.published_list= []
         reply= self.__send('<test>\n<eof>')
@@ -593,12 +1968,10 @@ class ServerProxy:
         for item in self.wisdom_list:
             if(item not in self.published_list):
                 self.erase(item)
+        self.pool.close()
 
     def add_data(self, data, ID):
-        text = '<data ID=' + ID + '>'
-        text += data
-        text += '<eof>'
-        reply = self.__send(text)
+        reply = self.__send('<data ID=' + ID + '>', data, '<eof>')
         return reply
 
     def save_wisdom(self, ID):
@@ -614,40 +1987,41 @@ class ServerProxy:
         return reply
 
     def load_wisdom(self, data, ID):
-        text = '<load ID=' + ID + '>'
-        text += data
-        text += '<eof>'
-        reply = self.__send(text)
+        reply = self.__send('<load ID=' + ID + '>', data, '<eof>')
+        return reply
+
+    def save_wisdom_to(self, ID, output):
+        """
+        Like save_wisdom(), but the reply is written to the binary file
+        'output' while it is received. Return the number of bytes written.
+        """
+        return self.__send('<save ID=' + ID + '><eof>', output= output)
+
+    def save_rdf_to(self, ID, output):
+        return self.__send('<save_rdf ID=' + ID + '><eof>', output= output)
+
+    def load_wisdom_from(self, source, ID):
+        """
+        Like load_wisdom(), but the data is read from the binary file
+        'source' while it is sent.
+        """
+        reply = self.__send('<load ID=' + ID + '>', source, '<eof>')
         return reply
 
     def query(self, data, ID):
-        text = '<question ID=' + ID + '>'
-        text += data
-        text += '<eof>'
-        reply = self.__send(text)
+        reply = self.__send('<question ID=' + ID + '>', data, '<eof>')
         return reply
 
     def wikidata_query(self, data, ID):
-        text = '<wikidata_question ID=' + ID + '>'
-        text += data
-        text += '<eof>'
-        reply = self.__send(text)
+        reply = self.__send('<wikidata_question ID=' + ID + '>', data, '<eof>')
         return reply
 
     def match(self, data, ID):
-        text = '<match ID=' + ID + '>'
-        text += data
-        text += '<eof>'
-        reply = self.__send(text)
+        reply = self.__send('<match ID=' + ID + '>', data, '<eof>')
         return reply
 
     def match_drs(self, drs, question, ID):
-        text = '<match_drs ID=' + ID + '>'
-        text += drs
-        text += ";"
-        text += question
-        text += '<eof>'
-        reply = self.__send(text)
+        reply = self.__send('<match_drs ID=' + ID + '>', drs, ';', question, '<eof>')
         return reply
 
     def erase(self, ID):
@@ -683,10 +2057,7 @@ class ServerProxy:
         return ID
 
     def writer_write(self, writer_ID, drs):
-        text = '<writer_write ID=' + writer_ID + '>'
-        text += drs
-        text += '<eof>'
-        ID = self.__send(text)
+        ID = self.__send('<writer_write ID=' + writer_ID + '>', drs, '<eof>')
         return ID
 
     def writer_write_answer(self, writer_ID, qID):
@@ -717,47 +2088,7 @@ class ServerProxy:
         return reply
 
     def set_wisdom_parameters(self, ID, wp):
-        accuracy_level = wp.get_accuracy_level()
-        num_answers    = wp.get_num_answers()
-        solver_options = wp.get_solver_options()
-        skip_presuppositions = wp.get_skip_presuppositions()
-        skip_solver = wp.get_skip_solver()
-        do_solver   = wp.get_do_solver()
-        add_data    = wp.get_add_data()
-        timeout     = wp.get_timeout()
-        fixed_time  = wp.get_fixed_time()
-        max_refs            = wp.get_max_refs()
-        max_candidates_refs = wp.get_max_candidates_refs()
-        max_candidates      = wp.get_max_candidates()
-        word_intersection = wp.get_word_intersection()
-        use_pertaynims    = wp.get_use_pertaynims()
-        use_synonyms      = wp.get_use_synonyms()
-        use_hyponyms      = wp.get_use_hyponyms()
-        num_hyponyms      = wp.get_num_hyponyms()
-        load_clauses      = wp.get_load_clauses()
-        implicit_verb     = wp.get_implicit_verb()
-        text = ('<wisdom_parameters ' 
-                + ' accuracy_level=' + str(accuracy_level) 
-                + ' num_answers='    + str(num_answers) 
-                + ' solver_options=' + solver_options 
-                + ' skip_presuppositions=' + skip_presuppositions 
-                + ' skip_solver=' + skip_solver 
-                + ' do_solver='   + do_solver 
-                + ' add_data='    + add_data 
-                + ' ID='          + ID
-                + ' timeout='     + str(timeout)
-                + ' fixed_time='  + str(fixed_time)
-                + ' max_refs='    + str(max_refs)
-                + ' max_candidates_refs=' + str(max_candidates_refs)
-                + ' max_candidates='      + str(max_candidates)
-                + ' word_intersection='   + word_intersection
-                + ' use_pertaynims='      + use_pertaynims
-                + ' use_synonyms='        + use_synonyms
-                + ' use_hyponyms='        + use_hyponyms
-                + ' num_hyponyms='        + str(num_hyponyms)
-                + ' implicit_verb='       + implicit_verb
-                + '>'
-        )
+        text = wisdom_parameters_request(ID, wp)
         text += '<eof>'
         reply = self.__send(text)
         return reply
@@ -795,30 +2126,137 @@ class ServerProxy:
         self.wisdom_list.append(ID)
         return ID
 
+    def set_timeout(self, timeout):
+        """
+        Timeout in seconds for the socket operations (None = no timeout)
+        """
+        self.pool.timeout = timeout
 
-    def __send(self, text): 
+
+    def __send(self, *parts, output= None): 
         """
-        Helper function for sending information on a socket.  Send the 'text'
-        and return the 'answer'.
+        Helper function for sending information on a socket.  Send the 'parts'
+        of the request (header, body, '<eof>') and return the 'answer'.
+
+        Every part is encoded only once and the parts are never joined
+        together, unless the whole request is small. A part can also be a
+        binary file, which is sent in chunks of 'recv_size' bytes. If an
+        'output' binary file is given, the answer is written to it as it
+        arrives and the number of bytes written is returned instead.
+
+        The connection is taken from the pool. If the server terminates the
+        answer with '<eof>' the connection is kept open and given back to
+        the pool, otherwise the answer ends when the server closes it.
+        A pooled connection that fails before any byte of the answer has
+        been received is retried once; after that the server may already
+        have executed the command, so the error is raised.
         """
-        sock= socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect( (self.ip,self.port) )
+        data= [part.encode('utf-8') if isinstance(part, str) else part for part in parts]
+        files= [(item, item.tell()) for item in data if hasattr(item, 'read')]
+        if not files and sum(len(item) for item in data) <= self.recv_size:
+            data= [b''.join(data)]
+        if output is not None:
+            start= output.tell()
+        sock, reused = self.pool.get()
+        received= [False]   # set by __receive() with the first bytes of the answer
+        try:
+            answer, keep_alive = self.__exchange(sock, data, output, received)
+            stale = reused and not keep_alive and not answer
+        except socket.timeout:
+            sock.close()
+            raise
+        except OSError:
+            if not reused or received[0]:
+                sock.close()
+                raise
+            stale = True
+        except BaseException:
+            # e.g. a file part that cannot be read: the request is incomplete
+            sock.close()
+            raise
+        if stale:
+# The pooled connection was closed by the server: retry once on a new one
+            sock.close()
+            for item, position in files:
+                item.seek(position)
+            if output is not None:
+                output.seek(start)
+                output.truncate()
+            sock = self.pool.connect()
+            try:
+                answer, keep_alive = self.__exchange(sock, data, output)
+            except BaseException:
+                sock.close()
+                raise
+        if keep_alive:
+            self.pool.put(sock)
+        else:
+            sock.close()
+        return answer
+
+    def __exchange(self, sock, data, output= None, received= None):
 # Send the question to the server
-        totalsent= 0
-        while totalsent < len(text):
-            to_send= text[totalsent:].encode('utf-8')
-            sent= sock.send(to_send)
-            totalsent += sent
+        for item in data:
+            if hasattr(item, 'read'):
+                while True:
+                    chunk= item.read(self.recv_size)
+                    if not chunk:
+                        break
+                    sock.sendall(chunk)
+            else:
+                sock.sendall(item)
 # Receive the answer
-        answer= answerold= ''
-        CHUNKLEN= 256
-        while len(answerold) <= len(answer):
-            answerold = answer
-            chunk= sock.recv(CHUNKLEN)
-            if chunk == b'':
-                break
-            answer += chunk.decode('utf-8')
-        return answer
+        if received is None:
+            received= [False]
+        if output is not None:
+            return self.__receive_to(sock, output, received)
+        return self.__receive(sock, received)
+
+    def __receive(self, sock, received):
+        """
+        Read an answer from the socket. The answer ends either with the
+        '<eof>' tag (and the connection can be reused) or when the server
+        closes the connection. The bytes are decoded only once at the end,
+        so that multibyte characters split between two chunks are not broken.
+        """
+        answer= bytearray()
+        buffer= bytearray(self.recv_size)
+        view= memoryview(buffer)
+        while True:
+            size= sock.recv_into(buffer)
+            if size == 0:
+                return answer.decode('utf-8'), False
+            received[0]= True
+            answer += view[:size]
+            if answer.endswith(b'<eof>'):
+                del answer[-len(b'<eof>'):]
+                return answer.decode('utf-8'), True
+
+    def __receive_to(self, sock, output, received):
+        """
+        The same as __receive(), but the answer is written to 'output' as
+        it arrives. Only the last bytes, which could be the beginning of
+        '<eof>', are held back.
+        """
+        tail= bytearray()
+        buffer= bytearray(self.recv_size)
+        view= memoryview(buffer)
+        written= 0
+        while True:
+            size= sock.recv_into(buffer)
+            if size == 0:
+                output.write(tail)
+                return written + len(tail), False
+            received[0]= True
+            tail += view[:size]
+            if tail.endswith(b'<eof>'):
+                del tail[-len(b'<eof>'):]
+                output.write(tail)
+                return written + len(tail), True
+            if len(tail) > len(b'<eof>'):
+                output.write(tail[:-len(b'<eof>')])
+                written += len(tail) - len(b'<eof>')
+                del tail[:-len(b'<eof>')]
 
 class Match:
     """
@@ -830,6 +2268,9 @@ class Match:
 
     def __execute__(self,argument):
         answer= argument.match(self.text) # The argument can be a Wisdom or an Answer (they both have the method match() )
+        self.__dispatch__(answer)
+
+    def __dispatch__(self,answer):
         if answer.is_positive(): 
             for function in self.function_list:
                 function(answer)    
@@ -842,12 +2283,20 @@ class Match:
 class Commands:
     """
     Manages the command list
+
+    execute() matches all the texts at the same time (at most
+    'max_concurrency'), then calls the bound functions in the order of
+    the command list. The results are kept until the Wisdom (or the
+    Answer) changes, so only new texts are matched again.
     """
-    def __init__(self,argument):
+    def __init__(self,argument,max_concurrency= 8):
         if not isinstance(argument,Wisdom) and not isinstance(argument,Answer):
             raise TypeError('The argument in Commands() must be set to an instance of NLUlite.Wisdom or NLUlite.Answer')
         self.wisdom= argument
         self.match_list= []
+        self.max_concurrency= max_concurrency
+        self.memo= {}          # text -> answer, valid while the state is 'memo_state'
+        self.memo_state= None
     
     def parse(self,argument):
         self.wisdom= argument
@@ -857,9 +2306,33 @@ class Commands:
             raise TypeError('The match attribute in Commands.add() must be set to an instance of NLUlite.Match')
         self.match_list.append(match)
 
+    def __state__(self):
+        """
+        Return what the matches depend on: the argument and its version
+        """
+        argument= self.wisdom
+        if isinstance(argument, Answer):
+            wisdom= argument.wisdom
+            return (id(argument), getattr(wisdom, 'generation', None), tuple(map(id, argument.answer_elements)))
+        return (id(argument), argument.generation)
+
     def execute(self):
+        state= self.__state__()
+        if state != self.memo_state:
+            self.memo= {}
+            self.memo_state= state
+        texts= list(dict.fromkeys(match.text for match in self.match_list if match.text not in self.memo))
+        answers= run_concurrently(self.wisdom.match, texts, self.max_concurrency)
+        errors= {}
+        for text, answer in zip(texts, answers):
+            if isinstance(answer, Exception):
+                errors[text]= answer
+            else:
+                self.memo[text]= answer
         for match in self.match_list:       
-            match.__execute__(self.wisdom)
+            if match.text in errors:
+                raise errors[match.text]
+            match.__dispatch__(self.memo[match.text])
             
             
             
@@ -869,9 +2342,9 @@ class Wikidata:
     Answer the question through a query to Wikidata.
 
     It connects to the NLUlite server to transform natural language 
-    into a Wikidata query.
+    into a Wikidata query. The replies can be cached as in Wisdom.
     """
-    def __init__(self,server):
+    def __init__(self,server, cache= None):
         if not isinstance(server, ServerProxy):
             raise TypeError('The server attribute must be set to an instance of NLUlite.ServerProxy')
         self.server= server
@@ -879,10 +2352,739 @@ class Wikidata:
         if reply == "<error>":
             raise TypeError('You must start the server with the --wikidata option')        
         self.ID = reply
+        self.cache= cache
+        self.parameters= ''
+        self.generation= 0
+        self.fingerprint= 'wikidata'
+        self.writer_pool= WriterPool(self)
+
+    def close(self):
+        """
+        Erase the Writers of the wikidata wisdom from the server
+        """
+        self.writer_pool.close()
 
     def ask(self,question):        
-        reply = self.server.wikidata_query(question, self.ID)
+        reply, cached = cached_request(self, 'wikidata_query', question)
+        answer= process_query_reply(self,reply)
+        answer.cached = cached
+        return answer
+
+
+class FeedPoller:
+    """
+    Polls feeds and adds only their new items to a wisdom.
+
+    Every feed is requested with the ETag and Last-Modified headers of
+    the previous poll, so an unchanged feed is not downloaded again, and
+    the hashes of the items already added are remembered for each feed
+    (at most 'max_items' of them). The state can be kept between runs
+    with save_state() and load_state().
+    """
+    def __init__(self, wisdom, max_items= 10000):
+        self.wisdom= wisdom
+        self.max_items= max_items
+        self.feeds= {}   # url -> {'etag': ..., 'modified': ..., 'seen': [item hashes]}
+        self.http= urllib3.PoolManager()
+        self.lock= threading.Lock()
+
+    def poll(self, url):
+        """
+        Add the new items of the feed, and return how many they are
+        """
+        with self.lock:
+            state= self.feeds.setdefault(url, {'etag': None, 'modified': None, 'seen': []})
+        headers= {}
+        if state['etag']:
+            headers['If-None-Match']= state['etag']
+        if state['modified']:
+            headers['If-Modified-Since']= state['modified']
+        req= self.http.request('GET', url, headers= headers, preload_content= False)
+        if req.status == 304:
+            req.release_conn()
+            return 0
+        if req.status != 200:
+            req.release_conn()
+            raise RuntimeError('The feed ' + url + ' was not found')
+        feeder= FeedTemplateFactory().get(url)
+        for page in unescape_chunks(read_response(req)):
+            feeder.feed(page)
+        feeder.close()
+        seen= set(state['seen'])
+        new_items= []
+        new_keys= []
+        for item in feeder.get_items():
+            key= hashlib.sha1(item.encode('utf-8')).hexdigest()[:16]
+            if key in seen:
+                continue
+            seen.add(key)
+            new_keys.append(key)
+            new_items.append(item)
+        if new_items:
+            self.wisdom.add('[% '+url+' %]\n' + ''.join(new_items))
+# The state changes only when the new items have been added
+        with self.lock:
+            state['seen']= (state['seen'] + new_keys)[-self.max_items:]
+            state['etag']= req.headers.get('ETag')
+            state['modified']= req.headers.get('Last-Modified')
+        return len(new_items)
+
+    def poll_many(self, urls= None, max_concurrency= 8):
+        """
+        Poll the feeds (all the known feeds if 'urls' is not given).
+        Return the number of new items of every feed, or the exception.
+        """
+        if urls is None:
+            urls= list(self.feeds)
+        return run_concurrently(self.poll, urls, max_concurrency)
+
+    def save_state(self, filename):
+        filename = os.path.expanduser(filename)
+        with self.lock:
+            data= json.dumps(self.feeds)
+        write_file(filename, data)
+
+    def load_state(self, filename):
+        filename = os.path.expanduser(filename)
+        data= json.loads(read_file(filename))
+        with self.lock:
+            self.feeds= data
+
+
+## A sentence that begins with 'If' is taken for an inference rule
+RULE_PATTERN = re.compile(r'(?:^|[.!?]\s+)If\s')
+
+class ShardedWisdom:
+    """
+    Spreads one wisdom over several servers.
+
+    Every text added goes whole to one Wisdom per server (the hash of the
+    text chooses the shard), so that a document stays together. The
+    paragraphs that look like inference rules ('If an animal has no limbs
+    it cannot walk.') are added to every shard, as a rule must be next to
+    the facts it applies to. The questions are asked to all the shards in
+    parallel and the answers are joined together.
+
+    A joined answer cannot be commented as a whole, since every shard
+    knows only its own part of it: Answer.comment() (and Writer.write())
+    raises RuntimeError.
+    The answers of the single shards are in Answer.shards.
+    """
+    def __init__(self, servers):
+        servers = list(servers)
+        if not servers:
+            raise ValueError('ShardedWisdom needs at least one NLUlite.ServerProxy')
+        for server in servers:
+            if not isinstance(server, ServerProxy):
+                raise TypeError('The servers attribute must be a list of instances of NLUlite.ServerProxy')
+        self.shards = run_concurrently(Wisdom, servers, len(servers))
+        for shard in self.shards:
+            if isinstance(shard, Exception):
+                raise shard
+
+    def __partition__(self, text):
+        """
+        Return the text to add to every shard: the whole text for the
+        shard chosen by its hash, its rule paragraphs for the others.
+        A leading source tag ('[% url %]') is kept on every part.
+        """
+        tag = ''
+        match = re.match(r'\[%[^\n]*%\]\n', text)
+        if match:
+            tag = match.group(0)
+            text = text[match.end():]
+        parts = ['' for shard in self.shards]
+        if text.strip() == '':
+            return parts
+        rules = [paragraph for paragraph in re.split(r'\n\s*\n', text) if RULE_PATTERN.search(paragraph)]
+        if rules:
+            parts = [tag + '\n\n'.join(rules) for shard in self.shards]
+        index = zlib.crc32(text.encode('utf-8')) % len(self.shards)
+        parts[index] = tag + text
+        return parts
+
+    def __run__(self, function, items):
+        """
+        Call function(shard, item) on every shard in parallel
+        """
+        results = run_concurrently(lambda pair: function(*pair), zip(self.shards, items), len(self.shards))
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    def add(self, text):
+        parts = self.__partition__(text)
+        self.__run__(lambda shard, part: part and shard.add(part), parts)
+
+    def add_file(self, filename):
+        filename = os.path.expanduser(filename)
+        self.add(read_file(filename))
+
+    def add_url(self, url):
+        self.add(get_url_text(url))
+
+    def add_feed(self, url):
+        self.add(get_feed_text(url))
+
+    def save(self, filename, compression= None):
+        """
+        Every shard is saved in its own file, 'filename.0', 'filename.1', ...
+        """
+        filename = os.path.expanduser(filename)
+        names = [filename + '.' + str(index) for index in range(len(self.shards))]
+        self.__run__(lambda shard, name: shard.save(name, compression), names)
+
+    def save_string(self, compression= None):
+        return self.__run__(lambda shard, item: shard.save_string(compression), self.shards)
+
+    def load(self, filename):
+        filename = os.path.expanduser(filename)
+        names = [filename + '.' + str(index) for index in range(len(self.shards))]
+        self.__run__(lambda shard, name: shard.load(name), names)
+
+    def load_string(self, strings):
+        if len(strings) != len(self.shards):
+            raise ValueError('ShardedWisdom.load_string() needs one string per shard')
+        self.__run__(lambda shard, string: shard.load_string(string), strings)
+
+    def ask(self, question):
+        answers = self.__run__(lambda shard, item: shard.ask(question), self.shards)
+        return self.__join__(answers)
+
+    def match(self, question):
+        answers = self.__run__(lambda shard, item: shard.match(question), self.shards)
+        return self.__join__(answers)
+
+    def __join__(self, answers):
+        # join_answers() joins into the first answer: keep the shard one intact
+        first = Answer(answers[0].wisdom)
+        first.answer_elements = list(answers[0].answer_elements)
+        first.status      = answers[0].status
+        first.question_ID = answers[0].question_ID
+        answer = join_answers([first] + answers[1:])
+        answer.shards = answers
+        return answer
+
+    def ask_many(self, questions, max_concurrency= 8):
+        return run_concurrently(self.ask, questions, max_concurrency)
+
+    def match_many(self, questions, max_concurrency= 8):
+        return run_concurrently(self.match, questions, max_concurrency)
+
+    def clear(self):
+        self.__run__(lambda shard, item: shard.clear(), self.shards)
+
+    def set_wisdom_parameters(self, wp):
+        self.__run__(lambda shard, item: shard.set_wisdom_parameters(wp), self.shards)
+
+
+class ReplicatedWisdom:
+    """
+    Reads a published wisdom (see Wisdom.export_to_server()) from several
+    servers.
+
+    Every server imports the wisdom with the same key, and each question
+    goes to the replica with the least outstanding requests. A replica
+    that fails (timeout, connection error, undecodable or '<error>' reply)
+    is ejected for 'eject_time' seconds and the question is sent to
+    another one. Any other exception is raised at once.
+    Use ServerProxy.set_timeout() to choose when a replica times out.
+    """
+    def __init__(self, servers, key, eject_time= 30):
+        servers = list(servers)
+        if not servers:
+            raise ValueError('ReplicatedWisdom needs at least one NLUlite.ServerProxy')
+        for server in servers:
+            if not isinstance(server, ServerProxy):
+                raise TypeError('The servers attribute must be a list of instances of NLUlite.ServerProxy')
+        self.replicas = []
+        for server in servers:
+            wisdom = Wisdom(server)
+            wisdom.import_from_server(key)
+            self.replicas.append(wisdom)
+        self.eject_time = eject_time
+        self.outstanding = [0] * len(self.replicas)
+        self.ejected_until = [0] * len(self.replicas)
+        self.lock = threading.Lock()
+
+    def __choose__(self, excluded):
+        with self.lock:
+            now = time.time()
+            available = [index for index in range(len(self.replicas))
+                         if index not in excluded and self.ejected_until[index] <= now]
+            if not available:
+                raise RuntimeError('No replica of the wisdom is available')
+            index = min(available, key= lambda item : self.outstanding[item])
+            self.outstanding[index] += 1
+            return index
+
+    def __request__(self, command, question):
+        tried = set()
+        error = None
+        while True:
+            try:
+                index = self.__choose__(tried)
+            except RuntimeError as e:
+                raise e from error
+            replica = self.replicas[index]
+            failed = False   # other exceptions propagate, without ejecting the replica
+            try:
+                reply = getattr(replica.server, command)(question, replica.ID)
+                failed = reply == '<error>'
+            except (OSError, UnicodeDecodeError) as e:
+                # The replica is unreachable or its reply is garbled
+                failed = True
+                error = e
+            finally:
+                with self.lock:
+                    self.outstanding[index] -= 1
+                    if failed:
+                        self.ejected_until[index] = time.time() + self.eject_time
+            if not failed:
+                return process_query_reply(replica, reply)
+            tried.add(index)
+
+    def available(self):
+        """
+        Return the number of replicas that are not ejected
+        """
+        now = time.time()
+        return len([item for item in self.ejected_until if item <= now])
+
+    def ask(self, question):
+        return self.__request__('query', question)
+
+    def match(self, question):
+        return self.__request__('match', question)
+
+    def ask_many(self, questions, max_concurrency= 8):
+        return run_concurrently(self.ask, questions, max_concurrency)
+
+    def match_many(self, questions, max_concurrency= 8):
+        return run_concurrently(self.match, questions, max_concurrency)
+
+
+async def gather_concurrently(function, items, max_concurrency= 100):
+    """
+    The same as run_concurrently(), for a coroutine function: at most
+    'max_concurrency' calls are awaited at the same time.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    async def call(item):
+        async with semaphore:
+            try:
+                return await function(item)
+            except Exception as e:
+                return e
+    return await asyncio.gather(*[call(item) for item in items])
+
+
+class AsyncConnectionPool:
+    """
+    Helper class for AsyncServerProxy: keeps the idle stream connections
+    to the server so that they can be reused by the following commands
+    """
+    def __init__(self, ip, port, size= 4, idle_timeout= 60):
+        self.ip   = ip
+        self.port = port
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.idle = []
+
+    async def connect(self):
+        reader, writer = await asyncio.open_connection(self.ip, self.port)
+        sock= writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        return reader, writer
+
+    async def get(self):
+        """
+        Return a (reader, writer, reused) triple. Idle connections that are
+        too old, or that the server has closed in the meantime, are discarded.
+        """
+        now= time.time()
+        while self.idle:
+            reader, writer, last_used = self.idle.pop()
+            if now - last_used < self.idle_timeout and not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        reader, writer = await self.connect()
+        return reader, writer, False
+
+    def put(self, reader, writer):
+        if len(self.idle) < self.size:
+            self.idle.append( (reader, writer, time.time()) )
+            return
+        writer.close()
+
+    def close(self):
+        idle = self.idle
+        self.idle = []
+        for reader, writer, _ in idle:
+            writer.close()
+
+
+class AsyncServerProxy:
+    """
+    Server class for asyncio: it has the same commands as ServerProxy,
+    as coroutines. Create it with 'await AsyncServerProxy.create()' and
+    release it with 'await server.close()'.
+    """
+    def __init__(self, ip= "localhost", port= 4001, pool_size= 4, idle_timeout= 60, recv_size= 65536):
+
+        self.ip   = ip
+        self.port = port
+        self.recv_size = recv_size
+        self.pool = AsyncConnectionPool(ip, port, pool_size, idle_timeout)
+        self.wisdom_list= []
+        self.published_list= []
+
+    @classmethod
+    async def create(cls, *args, **kwargs):
+        server= cls(*args, **kwargs)
+        reply= await server.__send('<test>\n<eof>')
+        if reply != '<ok>':
+            raise RuntimeError('No valid server seems to be running.')
+        return server
+
+    async def close(self):
+        for item in self.wisdom_list:
+            if(item not in self.published_list):
+                await self.erase(item)
+        self.wisdom_list= []
+        self.pool.close()
+
+    async def add_data(self, data, ID):
+        reply = await self.__send('<data ID=' + ID + '>', data, '<eof>')
+        return reply
+
+    async def save_wisdom(self, ID):
+        reply = await self.__send('<save ID=' + ID + '><eof>')
+        return reply
+
+    async def save_rdf(self, ID):
+        reply = await self.__send('<save_rdf ID=' + ID + '><eof>')
+        return reply
+
+    async def load_wisdom(self, data, ID):
+        reply = await self.__send('<load ID=' + ID + '>', data, '<eof>')
+        return reply
+
+    async def query(self, data, ID):
+        reply = await self.__send('<question ID=' + ID + '>', data, '<eof>')
+        return reply
+
+    async def wikidata_query(self, data, ID):
+        reply = await self.__send('<wikidata_question ID=' + ID + '>', data, '<eof>')
+        return reply
+
+    async def match(self, data, ID):
+        reply = await self.__send('<match ID=' + ID + '>', data, '<eof>')
+        return reply
+
+    async def match_drs(self, drs, question, ID):
+        reply = await self.__send('<match_drs ID=' + ID + '>', drs, ';', question, '<eof>')
+        return reply
+
+    async def erase(self, ID):
+        reply = await self.__send('<erase ID=' + ID + '><eof>')
+        return reply
+
+    async def get_new_ID(self):
+        ID = await self.__send('<new_wisdom>\n<eof>')
+        self.wisdom_list.append(ID)
+        return ID
+
+    async def get_new_wikidata_ID(self):
+        ID = await self.__send('<new_wikidata>\n<eof>')
+        self.wisdom_list.append(ID)
+        return ID
+
+    async def get_new_writer_ID(self, wisdom_ID):
+        ID = await self.__send('<writer_new ID=' + wisdom_ID + '><eof>')
+        return ID
+
+    async def writer_erase(self, writer_ID):
+        ID = await self.__send('<writer_erase ID=' + writer_ID + '><eof>')
+        return ID
+
+    async def writer_write(self, writer_ID, drs):
+        ID = await self.__send('<writer_write ID=' + writer_ID + '>', drs, '<eof>')
+        return ID
+
+    async def writer_write_answer(self, writer_ID, qID):
+        ID = await self.__send('<writer_write_answer ID=' + writer_ID + '>', qID.rstrip().lstrip(), '<eof>')
+        return ID
+
+    async def send_to_publish(self, ID, publish_key, password, timer):
+        text = '<publish ID=' + ID + ' key=' + publish_key + ' passwd=' + password + ' timer=' + str(timer) + '>'
+        text += '<eof>'
+        reply = await self.__send(text)
+        if(reply != "<error>"):
+            self.published_list.append(ID);
+        return reply
+
+    async def get_from_published(self, ID, publish_key):
+        reply = await self.__send('<get_published ID=' + ID + ' key=' + publish_key + '><eof>')
+        return reply
+
+    async def clear_wisdom(self, ID):
+        reply = await self.__send('<erase_wisdom ID=' + ID + '><eof>')
+        return reply
+
+    async def set_wisdom_parameters(self, ID, wp):
+        text = wisdom_parameters_request(ID, wp)
+        text += '<eof>'
+        reply = await self.__send(text)
+        return reply
+
+    async def erase_exported(self, publish_key, password= ""):
+        reply = await self.__send('<erase_published' + ' key=' + publish_key + ' passwd=' + password + '><eof>')
+        if reply == "<error>":
+            raise RuntimeError('Erasing published Wisdom: wrong key or password.')
+        return
+
+    async def list_exported(self):
+        reply = await self.__send('<list_published><eof>')
+        plist= []
+        root= ET.fromstring(reply)
+        for item in root:
+            plist.append(item.text)
+        return plist
+
+    async def set_num_threads(self, num_threads):
+        reply = await self.__send('<server threads=' + str(num_threads) +'>\n<eof>')
+        return reply
+
+    async def __send(self, *parts):
+        """
+        Helper function for sending information on a stream connection.
+        It works as ServerProxy.__send().
+        """
+        data= [part.encode('utf-8') if isinstance(part, str) else part for part in parts]
+        reader, writer, reused = await self.pool.get()
+        received= [False]
+        try:
+            answer, keep_alive = await self.__exchange(reader, writer, data, received)
+            stale = reused and not keep_alive and answer == ''
+        except OSError:
+            if not reused or received[0]:
+                writer.close()
+                raise
+            stale = True
+        except BaseException:
+            writer.close()
+            raise
+        if stale:
+# The pooled connection was closed by the server: retry once on a new one
+            writer.close()
+            reader, writer = await self.pool.connect()
+            try:
+                answer, keep_alive = await self.__exchange(reader, writer, data, [False])
+            except BaseException:
+                writer.close()
+                raise
+        if keep_alive:
+            self.pool.put(reader, writer)
+        else:
+            writer.close()
+        return answer
+
+    async def __exchange(self, reader, writer, data, received):
+        for item in data:
+            writer.write(item)
+        await writer.drain()
+        answer= bytearray()
+        while True:
+            chunk= await reader.read(self.recv_size)
+            if chunk == b'':
+                return answer.decode('utf-8'), False
+            received[0]= True
+            answer += chunk
+            if answer.endswith(b'<eof>'):
+                del answer[-len(b'<eof>'):]
+                return answer.decode('utf-8'), True
+
+
+class AsyncWisdom:
+    """
+    Process the wisdom from asyncio code. Create it with
+    'await AsyncWisdom.create(server)'.
+
+    The answers have the same classes as the ones from Wisdom, but
+    Answer.match() and Answer.comment() cannot be used on them (they
+    raise TypeError): use AsyncWisdom.match_answer() and AsyncWriter.write()
+    instead.
+    """
+    def __init__(self, server, ID):
+        if not isinstance(server, AsyncServerProxy):
+            raise TypeError('The server attribute must be set to an instance of NLUlite.AsyncServerProxy')
+        self.server= server
+        self.ID= ID
+
+    @classmethod
+    async def create(cls, server):
+        if not isinstance(server, AsyncServerProxy):
+            raise TypeError('The server attribute must be set to an instance of NLUlite.AsyncServerProxy')
+        ID= await server.get_new_ID()
+        return cls(server, ID)
+
+    async def __match_drs_with_text__(self,drs,question):
+        reply = await self.server.match_drs(drs,question,self.ID)
+        answer= process_query_reply(self, reply)
+        return answer
+
+    async def match_answer(self, answer, text):
+        """
+        The same as answer.match(text)
+        """
+        for item in answer.answer_elements:
+            match= await self.__match_drs_with_text__(item.drs,text)
+            if match.is_positive():
+                return match
+        return Answer(self)
+
+    async def add(self, text):
+        reply = await self.server.add_data(text, self.ID);
+
+    async def add_file(self, filename):
+        filename = os.path.expanduser(filename)
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(None, read_file, filename)
+        await self.add(text)
+
+    async def add_url(self, url):
+        loop = asyncio.get_running_loop()
+        webtext = await loop.run_in_executor(None, get_url_text, url)
+        await self.add(webtext)
+
+    async def add_feed(self, url):
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(None, get_feed_text, url)
+        await self.add(text)
+
+    async def save(self, filename):
+        filename = os.path.expanduser(filename)
+        reply = await self.server.save_wisdom(self.ID);
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, write_file, filename, reply)
+
+    async def save_rdf(self, filename):
+        filename = os.path.expanduser(filename)
+        reply = await self.server.save_rdf(self.ID);
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, write_file, filename, reply)
+
+    async def save_string(self):
+        reply = await self.server.save_wisdom(self.ID);
+        return reply
+
+    async def load(self, filename):
+        filename = os.path.expanduser(filename)
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(None, read_file, filename)
+        reply = await self.server.load_wisdom(data, self.ID);
+
+    async def load_string(self, string):
+        reply = await self.server.load_wisdom(string, self.ID);
+
+    async def ask(self, question):
+        reply  = await self.server.query(question, self.ID)
+        answer = process_query_reply(self, reply)
+        return answer
+
+    async def match(self, question):
+        reply = await self.server.match(question, self.ID)
+        answer= process_query_reply(self, reply)
+        return answer
+
+    async def ask_many(self, questions, max_concurrency= 100):
+        """
+        The same as Wisdom.ask_many()
+        """
+        return await gather_concurrently(self.ask, questions, max_concurrency)
+
+    async def match_many(self, questions, max_concurrency= 100):
+        """
+        The same as Wisdom.match_many()
+        """
+        return await gather_concurrently(self.match, questions, max_concurrency)
+
+    async def export_to_server(self,key,password="",timer=-1):
+        reply = await self.server.send_to_publish(self.ID, key, password,timer);
+        if(reply == "<error>"):
+            raise RuntimeError('Cannot publish wisdom: The key ' + key + ' is already in use.')
+
+    async def import_from_server(self,key):
+        reply = await self.server.get_from_published(self.ID, key);
+        if(reply == "<error>"):
+            raise RuntimeError('Cannot retrieve wisdom: The key ' + key + ' does not exist')
+        self.ID= reply;  # This function erases the wisdom when succesful
+
+    async def clear(self):
+        reply = await self.server.clear_wisdom(self.ID);
+        if(reply == "<error>"):
+            raise RuntimeError('Cannot clear wisdom: The Wisdom.ID ' + self.ID + ' does not exist')
+
+    async def set_wisdom_parameters(self, wp):
+        if not isinstance(wp, WisdomParameters):
+            raise TypeError('The wisdom.set_wisdom_parameters attribute must be set to an instance of NLUlite.WisdomParameters')        
+        await self.server.set_wisdom_parameters(self.ID, wp);
+
+
+class AsyncWriter:
+    """
+    Writer class for asyncio. Create it with 'await AsyncWriter.create(wisdom)'
+    and release it with 'await writer.close()'.
+    """
+    def __init__(self, server, ID):
+        self.server = server
+        self.ID= ID
+
+    @classmethod
+    async def create(cls, wisdom):
+        if not isinstance(wisdom, AsyncWisdom) and not isinstance(wisdom, AsyncWikidata):
+            raise TypeError('The wisdom attribute must be set to an instance of NLUlite.AsyncWisdom or NLUlite.AsyncWikidata')
+        reply= await wisdom.server.get_new_writer_ID(wisdom.ID)
+        return cls(wisdom.server, reply)
+
+    async def close(self):
+        await self.server.writer_erase(self.ID);
+
+    async def write(self, answer):
+        if isinstance(answer, AnswerElement):
+            reply= await self.server.writer_write(self.ID, answer.drs)
+            return reply
+        if isinstance(answer, Answer):
+            reply= await self.server.writer_write_answer(self.ID, answer.question_ID)
+            return reply
+        raise TypeError('The answer attribute must be set to an instance of NLUlite.Anwer or NLUlite.AnswerElement')
+
+
+class AsyncWikidata:
+    """
+    Answer the question through a query to Wikidata, from asyncio code.
+    Create it with 'await AsyncWikidata.create(server)'.
+    """
+    def __init__(self, server, ID):
+        if not isinstance(server, AsyncServerProxy):
+            raise TypeError('The server attribute must be set to an instance of NLUlite.AsyncServerProxy')
+        self.server= server
+        self.ID = ID
+
+    @classmethod
+    async def create(cls, server):
+        if not isinstance(server, AsyncServerProxy):
+            raise TypeError('The server attribute must be set to an instance of NLUlite.AsyncServerProxy')
+        reply = await server.get_new_wikidata_ID()
+        if reply == "<error>":
+            raise TypeError('You must start the server with the --wikidata option')        
+        return cls(server, reply)
+
+    async def ask(self,question):        
+        reply = await self.server.wikidata_query(question, self.ID)
         answer= process_query_reply(self,reply)
         return answer
-        
-            
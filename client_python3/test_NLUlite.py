@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests of Wisdom.add_urls() and Wisdom.add_feeds() against local stand-ins:
+an http.server for the web and a minimal NLUlite server that stores
+the data it receives.
+
+Run with 'python -m unittest test_NLUlite' from this directory.
+"""
+
+import http.server, re, socketserver, threading, time, unittest, weakref
+import NLUlite
+
+PAGE = '<html><head><title>Snakes</title></head><body><p>A snake has no limbs.</p></body></html>'
+FEED = ('<rss><channel><title>News</title>'
+        '<item><title>Snakes</title><description>They hiss.</description></item>'
+        '</channel></rss>')
+
+
+class WebHandler(http.server.BaseHTTPRequestHandler):
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = WebHandler
+        with cls.lock:
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        try:
+            time.sleep(0.05)
+            if self.path.startswith('/page'):
+                self.reply(200, 'text/html; charset=utf-8', PAGE)
+            elif self.path.startswith('/feed'):
+                self.reply(200, 'application/rss+xml; charset=utf-8', FEED)
+            else:
+                self.reply(404, 'text/html', '<html><title>404 Not Found</title></html>')
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+    def reply(self, status, content_type, body):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class ServerHandler(socketserver.BaseRequestHandler):
+    """
+    Understands just enough of the NLUlite protocol for Wisdom.add()
+    """
+    data = []
+
+    def handle(self):
+        buffer = b''
+        while True:
+            while b'<eof>' not in buffer:
+                chunk = self.request.recv(65536)
+                if not chunk:
+                    return
+                buffer += chunk
+            request, buffer = buffer.split(b'<eof>', 1)
+            request = request.decode('utf-8')
+            command = re.match(r'<(\w+)', request).group(1)
+            if command == 'test':
+                reply = '<ok>'
+            elif command == 'new_wisdom':
+                reply = 'W1'
+            elif command == 'data':
+                ServerHandler.data.append(request[request.index('>') + 1:])
+                reply = '<ok>'
+            else:
+                reply = '<ok>'
+            self.request.sendall(reply.encode('utf-8') + b'<eof>')
+
+
+class ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class AddUrlsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.web = http.server.ThreadingHTTPServer(('127.0.0.1', 0), WebHandler)
+        cls.server = ThreadingTCPServer(('127.0.0.1', 0), ServerHandler)
+        for item in (cls.web, cls.server):
+            threading.Thread(target= item.serve_forever, daemon= True).start()
+        cls.base = 'http://127.0.0.1:%d/' % cls.web.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        for item in (cls.web, cls.server):
+            item.shutdown()
+            item.server_close()
+
+    def setUp(self):
+        ServerHandler.data = []
+        WebHandler.max_active = 0
+        proxy = NLUlite.ServerProxy('127.0.0.1', self.server.server_address[1])
+        self.wisdom = NLUlite.Wisdom(proxy)
+
+    def tearDown(self):
+        # ServerProxy.__del__ erases the wisdom: let it run while the server is up
+        self.wisdom.close()
+        del self.wisdom
+
+    def test_add_urls(self):
+        urls = [self.base + 'page%d' % index for index in range(4)] + [self.base + 'missing']
+        results = self.wisdom.add_urls(urls, max_concurrency= 8, max_per_host= 2)
+        self.assertEqual(results[:4], [None] * 4)
+        self.assertIsInstance(results[4], RuntimeError)
+        self.assertEqual(len(ServerHandler.data), 4)
+        for text in ServerHandler.data:
+            self.assertIn('A snake has no limbs.', text)
+            self.assertTrue(text.startswith('[% ' + self.base + 'page'))
+        self.assertLessEqual(WebHandler.max_active, 2)
+
+    def test_add_feeds(self):
+        results = self.wisdom.add_feeds([self.base + 'feed', self.base + 'missing'])
+        self.assertIsNone(results[0])
+        self.assertIsInstance(results[1], RuntimeError)
+        self.assertEqual(len(ServerHandler.data), 1)
+        self.assertIn('They hiss.', ServerHandler.data[0])
+        self.assertNotIn('Not Found', ServerHandler.data[0])
+
+    def test_close_without_cycle(self):
+        wisdom= NLUlite.Wisdom(self.wisdom.server)
+        writer= wisdom.writer_pool.get()
+        wisdom.writer_pool.put(writer)
+        wisdom.close()
+        self.assertEqual(wisdom.writer_pool.writers, [])
+        reference= weakref.ref(wisdom)
+        del wisdom, writer
+        self.assertIsNone(reference())
+
+    def test_get_feed_text_not_found(self):
+        with self.assertRaises(RuntimeError):
+            NLUlite.get_feed_text(self.base + 'missing')
+
+
+if __name__ == '__main__':
+    unittest.main()